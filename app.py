@@ -1,16 +1,78 @@
 import json
-import joblib
+import os
+from concurrent.futures import TimeoutError
+import pandas as pd
 # to launch api server:
 # python app.py
 from flask import Flask
 from flask import request
-from bpideep.getpatent import Patent
-from bpideep.getdata import company_search, bulk_search, company_search_fuzzy
-from bpideep.feateng import funding_amounts_employees, get_stage_age_ratio
-import pandas as pd
+from bpideep import feateng
+from bpideep.getdata import bulk_search, get_search_cache
+from bpideep.batchsearch import predict_companies
+from bpideep.lookup import company_lookup, companies_lookup, get_patent_cache
+from bpideep.registry import ModelRegistry
+from bpideep.inference import Timer, predict_all
+from bpideep.responsecache import ResponseCache
 
 app = Flask(__name__)
 
+# models are loaded once at import: with gunicorn preload_app the workers \
+# inherit them from the master, then each worker hot-swaps a model whose \
+# joblib file changes on disk
+registry = ModelRegistry().load()
+
+# the static lookups of the feature engineering are built here too, \
+# once for all the workers
+feateng.patents_by_id()
+feateng.zip_department_by_id()
+
+# /predict responses by company name and model versions, in each worker, \
+# and shared by the workers if BPIDEEP_SHARED_RESPONSE_CACHE is set
+RESPONSE_TTL = int(os.getenv('BPIDEEP_RESPONSE_TTL', 3600))
+response_cache = ResponseCache(ttl = RESPONSE_TTL,
+                               shared = bool(os.getenv('BPIDEEP_SHARED_RESPONSE_CACHE')))
+
+# most companies scored by a /predict/batch request
+MAX_BATCH = 100
+
+ERROR_MESSAGES = {'timeout': 'DealRoom did not answer in time',
+                  'api': 'Problem with the Api key',
+                  'not_found': 'Company name not found on DealRoom'}
+
+
+def cache_headers(timer, max_age = 0, hit = False):
+    '''
+    Server-Timing and Cache-Control headers, responses that are not cached \
+    are not to be stored by the clients either
+    '''
+    return {'Server-Timing': timer.server_timing(),
+            'Cache-Control': f'public, max-age={max_age}' if max_age else 'no-store',
+            'X-Cache': 'HIT' if hit else 'MISS'}
+
+
+def image_url(X, i):
+    '''
+    100x100 image of the i-th company of X, None if DealRoom has none
+    '''
+    images = X['images'].iloc[i] if 'images' in X else None
+    return images.get('100x100') if isinstance(images, dict) else None
+
+
+def prediction_response(X, X_preproc, results, i):
+    '''
+    response of the i-th company of X scored by predict_all
+    '''
+    return {
+            "prediction": str(results['prediction'][i]),
+            "prediction_proba": str(results['prediction_proba'][i]),
+            "time_predict": str(results['time_predict'][i]),
+            "lab_predict": str(results['lab_predict'][i]),
+            "X_preproc": X_preproc.iloc[[i]].reset_index(drop = True).to_dict(),
+            "image": image_url(X, i),
+            "description": X['about'].iloc[i],
+            'tags': X['tags'].iloc[i]
+            }
+
 @app.route('/')
 def index():
      return 'OK'
@@ -18,63 +80,92 @@ def index():
 @app.route('/predict', methods=['GET'])
 def predict():
     name = request.args['name']
-
-    # get nb of patents with Big Query
-    patent = Patent()
-    nb_patents = patent.get_nb_patents(name)
-
-    # get DealRoom datas
-    X = company_search(name)
-    # try:
-    img = X['images'][0]['100x100']
-    # except:
-    #     img = X['images'][0]['74x74']
-    # else:
-    #     img = X['images'][0]['32x32']
+    timer = Timer()
+
+    # the same company scored by the same models gives the same response
+    models, versions = registry.snapshot()
+    with timer.stage('cache'):
+        response, max_age = response_cache.get(name, versions)
+    if response is not None:
+        return response, 200, cache_headers(timer, max_age, hit = True)
+
+    # get DealRoom datas and nb of patents with Big Query, concurrently
+    try:
+        with timer.stage('lookup'):
+            X, nb_patents = company_lookup(name)
+    except TimeoutError:
+        return {"predictions": ERROR_MESSAGES['timeout']}, 200, cache_headers(timer)
 
     if isinstance(X,dict):
-        return {"predictions": 'Problem with the Api key'}
+        return {"predictions": ERROR_MESSAGES['api']}, 200, cache_headers(timer)
 
     if X.empty:
-        return {"predictions": 'Company name not found on DealRoom'}
+        return {"predictions": ERROR_MESSAGES['not_found']}, 200, cache_headers(timer)
 
     X['nb_patents'] = nb_patents
-    X_time = pd.DataFrame(funding_amounts_employees(X), columns = ['funding_employees_ratio'])
-    X_time['stage_age_ratio'] = get_stage_age_ratio(X)
-
-    # X_lab = [['nb_patents', 'doctor_yesno', 'zipcode']]
-    X_lab = X.copy()
-    X_lab['nb_patents'] = nb_patents
 
-    # importing models
-    pipeline = joblib.load('bpideepmodel.joblib')
-    model_time = joblib.load('bpideepmodel_time.joblib')
-    model_lab = joblib.load('bpideepmodel_lab.joblib')
-    # model_techno = joblib.load('modeltechno.joblib')
-
-    # storing models results
-    results = pipeline.predict(X)
-
-    # storing X preprocessed
-    X_preproc_array = pipeline.named_steps['featureencoder'].transform(X)
-    feat_list = pipeline.named_steps['featureencoder'].features_list
-    X_preproc = pd.DataFrame(X_preproc_array, columns = feat_list).fillna(0)
-
-    result_proba = pipeline.predict_proba(X)
-    time_result = model_time.predict_proba(X_time)
-    lab_result = model_lab.predict_proba(X_lab)
-    # techno_proba = model_techno.predictproba(Xtechno)
-
-    return {
-            "prediction": str(results[0]),
-            "prediction_proba": str(result_proba[0][1]),
-            "time_predict": str(time_result[0][1]),
-            "lab_predict": str(lab_result[0][1]),
-            "X_preproc": X_preproc.to_dict(),
-            "image": img,
-            "description": X['about'][0],
-            'tags': X['tags'][0]
-            }
+    # storing models results, the features shared by the three models \
+    # are computed once
+    X_preproc, results = predict_all(X, models, timer)
+    X_preproc = X_preproc.fillna(0)
+
+    response = prediction_response(X, X_preproc, results, 0)
+    response_cache.set(name, versions, response)
+
+    return response, 200, cache_headers(timer, RESPONSE_TTL)
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    # JSON body: {"names": [...]} or {"ids": [...]} (DealRoom ids)
+    body = request.get_json(force = True, silent = True) or {}
+    names, ids = body.get('names'), body.get('ids')
+    queries = names if names is not None else ids
+    if (names is None) == (ids is None) or not isinstance(queries, list):
+        return {"error": "expected a JSON body with a 'names' or an 'ids' list"}, 400
+    # names are strings, DealRoom ids integers (JSON true / false are not ids)
+    if names is not None and not all(isinstance(name, str) for name in names):
+        return {"error": "'names' must be a list of strings"}, 400
+    if ids is not None and not all(isinstance(id_, int) and not isinstance(id_, bool) for id_ in ids):
+        return {"error": "'ids' must be a list of integers"}, 400
+    if len(queries) > MAX_BATCH:
+        return {"error": f'at most {MAX_BATCH} companies per request'}, 400
+    if ids is not None:
+        queries = [str(id_) for id_ in ids]
+
+    timer = Timer()
+    models, versions = registry.snapshot()
+
+    # the names already scored by these models are served from the cache
+    responses = {}
+    if names is not None:
+        with timer.stage('cache'):
+            for name in names:
+                response, max_age = response_cache.get(name, versions)
+                if response is not None:
+                    responses[name] = response
+        names = [name for name in names if name not in responses]
+
+    # the other companies are looked up together, then scored with a single \
+    # predict_proba call per model
+    X, errors = pd.DataFrame(), {}
+    if names or ids:
+        with timer.stage('lookup'):
+            X, errors = companies_lookup(names = names, ids = ids)
+
+    responses.update({query: {"predictions": ERROR_MESSAGES[error]}
+                      for query, error in errors.items()})
+    if not X.empty:
+        X_preproc, results = predict_all(X, models, timer)
+        X_preproc = X_preproc.fillna(0)
+        for i, query in enumerate(X['query']):
+            responses[query] = prediction_response(X, X_preproc, results, i)
+            if names is not None:
+                response_cache.set(query, versions, responses[query])
+
+    # in the order of the request, repeated queries included
+    response = {"results": [dict(query = query, **responses[query]) for query in queries]}
+
+    return response, 200, {'Server-Timing': timer.server_timing(), 'Cache-Control': 'no-store'}
 
 @app.route('/search', methods=['GET'])
 def search():
@@ -87,31 +178,32 @@ def search():
     df = df[df.launch_year > 2010]
     df['amount'] = df.fundings.apply(lambda x : x['items'][0]['amount'])
     df = df.sort_values('amount', ascending=False).head(10)
-    df = df[['name', 'amount']]
-
-
-    # for every name in df predict deeptech or not deeptech
-    results_dic = {'name' : [], 'amount':[],'prediction':[]}
+    df = df[['id', 'name', 'amount']]
 
-    for i in df.index:
-        name = df.loc[i,'name']
-        amount = df.loc[i,'amount']
-
-        patent = Patent()
-        nb_patents = patent.get_nb_patents(name)
-        X = company_search(name)
-        if X.empty:
-            X = company_search_fuzzy(name)
-        X['nb_patents'] = nb_patents
-        pipeline = joblib.load('bpideepmodel.joblib')
-        results = pipeline.predict(X)
+    # predict deeptech or not deeptech for all the companies at once
+    results_dic = {'name' : [], 'amount':[],'prediction':[], 'prediction_proba':[]}
+    X = predict_companies(df, registry.get('main'))
+    if isinstance(X, dict):
+        return {"predictions": 'Problem with the Api key'}
 
-        results_dic['name'].append(str(name))
-        results_dic['amount'].append(str(amount))
-        results_dic['prediction'].append(str(results[0]))
+    amounts = dict(zip(df['id'], df['amount']))
+    for i in X.index:
+        results_dic['name'].append(str(X.loc[i, 'name']))
+        results_dic['amount'].append(str(amounts[X.loc[i, 'id']]))
+        results_dic['prediction'].append(str(X.loc[i, 'prediction']))
+        results_dic['prediction_proba'].append(str(X.loc[i, 'prediction_proba']))
 
     return results_dic
 
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    # hits, misses and BigQuery bytes saved by the patent counts cache, \
+    # and the hits and misses of the /predict responses and DealRoom searches caches
+    stats = get_patent_cache().stats()
+    stats['responses'] = response_cache.stats()
+    stats['companies'] = get_search_cache().stats()
+    return stats
+
 
 if __name__ == '__main__':
     app.run(host='127.0.0.1', port=8080, debug=True)
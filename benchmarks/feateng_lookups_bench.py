@@ -0,0 +1,47 @@
+# -*- coding: UTF-8 -*-
+""" Import time of bpideep.feateng and time of the calls using the
+patents.csv and id_zip.csv lookups (zip_code, department, feat_eng_cols)
+
+    python -m benchmarks.feateng_lookups_bench [nb_rows]
+"""
+
+# Import from standard library
+import subprocess
+import sys
+import time
+# Import from our lib
+from tests.fixtures import make_companies
+
+
+def import_time(module, repeat=5):
+    """ best wall time of a fresh interpreter importing module
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', f'import {module}'], check=True)
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+
+def call_time(function, data, repeat=20):
+    """ best time of function on a copy of data (the calls add columns)
+    """
+    durations = []
+    for _ in range(repeat):
+        copy = data.copy()
+        start = time.perf_counter()
+        function(copy)
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+
+if __name__ == '__main__':
+    nb_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    print(f'python -c "import bpideep.feateng"  {import_time("bpideep.feateng"):.3f} s')
+
+    from bpideep import feateng
+    data = make_companies(nb_rows)
+    for name in ['zip_code', 'department', 'feat_eng_cols']:
+        duration = call_time(getattr(feateng, name), data)
+        print(f'{name:<15} {nb_rows} rows  {1000 * duration:.2f} ms')
@@ -0,0 +1,38 @@
+# -*- coding: UTF-8 -*-
+""" Time and peak memory of building the getfulldata frame from batch answers:
+one pd.concat per batch (previous getfulldata) against answers_data
+
+    python -m benchmarks.getfulldata_bench [nb_ids ...]
+"""
+
+# Import from standard library
+import sys
+import time
+import tracemalloc
+# Import from our lib
+from bpideep.getdata import fields_tolist, answers_data
+from tests.fixtures import make_answers
+from tests.reference import concat_data
+
+
+def measure(function, labelled_answers, fields_list):
+    tracemalloc.start()
+    start = time.perf_counter()
+    function(labelled_answers, fields_list)
+    duration = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return duration, peak
+
+
+if __name__ == '__main__':
+    fields_list = fields_tolist('fields_list.txt')
+    for nb_ids in [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 30000]:
+        labelled_answers = make_answers(nb_ids, fields_list)
+        for function in [concat_data, answers_data]:
+            # answers_data adds the label keys to the items, work on copies
+            answers = [(company_type, {'items': [dict(item) for item in answer['items']]})
+                       for company_type, answer in labelled_answers]
+            duration, peak = measure(function, answers, fields_list)
+            print(f'{nb_ids:>7} ids  {function.__name__:<13} {duration:8.2f} s  '
+                  f'peak {peak / 2**20:8.1f} MiB')
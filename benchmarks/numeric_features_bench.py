@@ -0,0 +1,63 @@
+# -*- coding: UTF-8 -*-
+""" Scalar features (stage_age_ratio, year_of_existence, founder flags,
+funding_employees_ratio) and department: previous map / apply / row loop
+implementation (the baseline join for department) against the array
+kernel of feateng
+
+    python -m benchmarks.numeric_features_bench [nb_rows ...]
+"""
+
+# Import from standard library
+import sys
+import time
+# Import from third party
+import numpy as np
+import pandas as pd
+# Import from our lib
+from bpideep import feateng
+from tests.reference import rowwise_numeric_features, baseline_department
+from tests.fixtures import ZIPS, STAGES, known_ids
+
+
+def make_scalars(nb_rows, seed=0):
+    """ the DealRoom columns read by the scalar features, without the lists
+    """
+    random = np.random.RandomState(seed)
+    # distinct ids: the baseline department joins on them
+    ids = np.array((known_ids() + list(range(10000000, 10000000 + nb_rows)))[:nb_rows])
+    return pd.DataFrame({
+        'id': random.permutation(ids),
+        'growth_stage': np.array(STAGES, dtype=object)[random.randint(len(STAGES), size=nb_rows)],
+        'launch_year': np.where(random.rand(nb_rows) < 0.05, np.nan,
+                                random.randint(2000, 2022, size=nb_rows).astype(float)),
+        'has_strong_founder': random.rand(nb_rows) < 0.3,
+        'has_super_founder': random.rand(nb_rows) < 0.1,
+        'total_funding_source': random.randint(0, 10**7, size=nb_rows).astype(float),
+        'employees_latest': random.randint(1, 200, size=nb_rows).astype(float),
+        'hq_locations': [[] if r < 0.1 else [{'zip': ZIPS[i]}]
+                         for r, i in zip(random.rand(nb_rows), random.randint(len(ZIPS), size=nb_rows))],
+    })
+
+
+def best_time(function, repeat=3):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+
+if __name__ == '__main__':
+    for nb_rows in [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]:
+        data = make_scalars(nb_rows)
+        timings = [
+            ('numeric features', lambda: rowwise_numeric_features(data, 2020),
+             lambda: feateng.numeric_features(data, 2020)),
+            ('department', lambda: baseline_department(data, feateng.TARGET_ZIP),
+             lambda: feateng.department(data)),
+        ]
+        for name, rowwise, kernel in timings:
+            before, after = best_time(rowwise), best_time(kernel)
+            print(f'{nb_rows:>7} rows  {name:<17} rowwise {1000 * before:9.1f} ms  '
+                  f'kernel {1000 * after:8.1f} ms  x{before / after:.0f}')
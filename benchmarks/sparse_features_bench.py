@@ -0,0 +1,60 @@
+# -*- coding: UTF-8 -*-
+""" Main features on the full tag vocabulary (every value of the encoded
+columns, not only KEPT_TAGS): dense dataframe of feat_eng_cols against the
+csr matrix of the sparse FeatEncoder, memory of the result, peak memory
+of the encoding and of the fit of the main pipeline
+
+    python -m benchmarks.sparse_features_bench [nb_rows ...]
+"""
+
+# Import from standard library
+import sys
+import time
+import tracemalloc
+# Import from third party
+import numpy as np
+import pandas as pd
+# Import from our lib
+from bpideep import trainer
+from bpideep.encoders import FeatEncoder
+from bpideep.feateng import all_tags
+from tests.fixtures import make_companies
+
+
+def measure(function):
+    """ returns (result, seconds, peak MB allocated while running function)
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    duration = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, duration, peak / 2**20
+
+
+def size_mb(features):
+    if isinstance(features, pd.DataFrame):
+        return features.memory_usage(deep=True).sum() / 2**20
+    return (features.data.nbytes + features.indices.nbytes + features.indptr.nbytes) / 2**20
+
+
+def fit_main(X, y, tags, sparse):
+    t = trainer.Trainer(X.copy(), y)
+    t.set_pipeline(sparse=sparse, kept_tags=tags)
+    return t.pipeline.fit(t.X, y)
+
+
+if __name__ == '__main__':
+    for nb_rows in [int(arg) for arg in sys.argv[1:]] or [1000, 5000]:
+        X = make_companies(nb_rows)
+        y = pd.Series(np.arange(nb_rows) % 2)
+        tags = all_tags(X.copy())
+        print(f'{nb_rows} rows, {len(tags)} tags')
+        for name, sparse in [('dense', False), ('sparse', True)]:
+            features, duration, peak = measure(
+                lambda: FeatEncoder(sparse=sparse, kept_tags=tags).fit_transform(X.copy()))
+            print(f'  {name:<6} features {size_mb(features):8.1f} MB  '
+                  f'encoding {1000 * duration:8.1f} ms peak {peak:8.1f} MB', end='')
+            _, duration, peak = measure(lambda: fit_main(X, y, tags, sparse))
+            print(f'  fit {1000 * duration:8.1f} ms peak {peak:8.1f} MB')
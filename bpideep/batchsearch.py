@@ -0,0 +1,57 @@
+import time
+from bpideep.getpatent import Patent
+from bpideep.getdata import getbatchdata, fields_tolist
+from bpideep.lookup import executor, get_patent_cache, patent_counts_or_local, remaining, DEADLINE
+
+
+def fetch_companies(companies, timeout = None, deadline = DEADLINE, client = None):
+    '''
+    takes a dataframe with the 'id' and 'name' of DealRoom companies \
+    (as returned by bulk_search)
+    fetches all the companies with one DealRoom batch call and all their \
+    patent counts with one BigQuery query, both running concurrently
+    returns the DealRoom dataframe in the order of companies, \
+    with a 'nb_patents' column
+    returns the DealRoom error dict if the batch call failed
+    if the patent counts fail or are not there deadline seconds after the call, \
+    the patents.csv counts are used instead (np.nan for the unknown ids)
+    '''
+    start = time.monotonic()
+    ids = companies['id'].tolist()
+    names = companies['name'].tolist()
+    fields_list = fields_tolist('fields_list.txt')
+
+    patent_future = executor.submit(Patent(cache = get_patent_cache()).get_bulk_nb_patents, names, timeout = timeout)
+    X = getbatchdata([str(id_) for id_ in ids], fields_list, client = client)
+    if isinstance(X, dict) or X.empty:
+        patent_future.cancel()
+        return X
+
+    # the batch endpoint does not keep the order of the ids
+    X = X.drop_duplicates(subset = 'id').set_index('id')
+    X = X.reindex([id_ for id_ in ids if id_ in X.index]).reset_index()
+
+    names_by_id = dict(zip(ids, names))
+    X['nb_patents'] = patent_counts_or_local(patent_future, remaining(start, deadline), X['id'],
+                                             names = [names_by_id[id_] for id_ in X['id']])
+
+    return X
+
+
+def predict_companies(companies, pipeline, timeout = None, deadline = DEADLINE, client = None):
+    '''
+    scores all the companies with a single predict_proba call
+    returns the DealRoom dataframe with 'prediction' and 'prediction_proba' columns
+    '''
+    X = fetch_companies(companies, timeout = timeout, deadline = deadline, client = client)
+    if isinstance(X, dict) or X.empty:
+        return X
+
+    # predict is the most probable class: the features are computed once \
+    # (on a copy, the feature engineering adds columns to its input)
+    results_proba = pipeline.predict_proba(X.copy())
+
+    X['prediction'] = pipeline.steps[-1][1].classes_[results_proba.argmax(axis = 1)]
+    X['prediction_proba'] = results_proba[:, 1]
+
+    return X
@@ -0,0 +1,207 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+def cache_dir():
+    '''
+    directory of the cache files: BPIDEEP_CACHE_DIR, or bpideep in the user \
+    cache directory (XDG_CACHE_HOME, ~/.cache by default), out of the source tree
+    '''
+    default = os.path.join(os.getenv('XDG_CACHE_HOME', os.path.expanduser(os.path.join('~', '.cache'))),
+                           'bpideep')
+    return os.getenv('BPIDEEP_CACHE_DIR', default)
+
+
+class SQLiteCache():
+    '''
+    key / value cache stored in a SQLite file: every process opening the same \
+    path (e.g. the gunicorn workers) shares the entries and the counters
+    entries expire ttl seconds after being stored, and the least recently used \
+    ones are evicted when there are more than max_entries
+    keys and values are JSON serializable objects
+    a hit does not write to the file, which would lock it for the other workers:
+    - the last access of an entry is only updated when it is older than \
+    touch_interval seconds, the recency of the eviction being that coarse
+    - the counters are added up in memory and written with the next set, \
+    or a hit flush_interval seconds after the previous write
+    '''
+
+    def __init__(self, path, ttl = 30 * 24 * 3600, max_entries = 100000,
+                 touch_interval = 60, flush_interval = 10):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.touch_interval = touch_interval
+        self.flush_interval = flush_interval
+        self.pending = {}
+        self.pending_lock = threading.Lock()
+        self.last_flush = time.monotonic()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok = True)
+        with self.connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS entries ('
+                         'key TEXT PRIMARY KEY, value TEXT, cost INTEGER, '
+                         'created REAL, last_access REAL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)')
+            conn.execute('CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER)')
+
+
+    @contextmanager
+    def connect(self):
+        # one connection per call: nothing is shared across threads or forks
+        conn = sqlite3.connect(self.path, timeout = 10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+
+    def incr(self, name, value = 1):
+        '''
+        adds value to a counter in memory, until the next flush
+        '''
+        with self.pending_lock:
+            self.pending[name] = self.pending.get(name, 0) + value
+
+
+    def flush(self, conn):
+        '''
+        writes the counters added up in memory
+        '''
+        with self.pending_lock:
+            pending, self.pending = self.pending, {}
+            self.last_flush = time.monotonic()
+        conn.executemany('INSERT INTO counters VALUES (?, ?) '
+                         'ON CONFLICT(name) DO UPDATE SET value = value + excluded.value',
+                         list(pending.items()))
+
+
+    def get(self, key, default = None):
+        '''
+        returns the value stored for key, default if it is missing or expired \
+        (the expired entries are deleted by set)
+        '''
+        key = json.dumps(key)
+        now = time.time()
+        with self.connect() as conn:
+            row = conn.execute('SELECT value, cost, created, last_access FROM entries '
+                               'WHERE key = ?', (key,)).fetchone()
+            if row is None or row[2] + self.ttl < now:
+                self.incr('misses')
+                return default
+            if row[3] + self.touch_interval <= now:
+                conn.execute('UPDATE entries SET last_access = ? WHERE key = ?', (now, key))
+            self.incr('hits')
+            # cost of the request that produced the value, saved by this hit
+            self.incr('cost_saved', row[1])
+            if time.monotonic() - self.last_flush >= self.flush_interval:
+                self.flush(conn)
+        return json.loads(row[0])
+
+
+    def set(self, key, value, cost = 0):
+        '''
+        stores value for key, cost being what it took to compute it \
+        (e.g. bytes processed by a query)
+        '''
+        self.set_many([(key, value, cost)])
+
+
+    def set_many(self, items):
+        '''
+        stores a list of (key, value, cost) in one transaction
+        '''
+        now = time.time()
+        with self.connect() as conn:
+            conn.executemany('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)',
+                             [(json.dumps(key), json.dumps(value), int(cost or 0), now, now)
+                              for key, value, cost in items])
+            conn.execute('DELETE FROM entries WHERE created < ?', (now - self.ttl,))
+            # least recently used eviction
+            conn.execute('DELETE FROM entries WHERE key IN ('
+                         'SELECT key FROM entries ORDER BY last_access DESC LIMIT -1 OFFSET ?)',
+                         (self.max_entries,))
+            self.flush(conn)
+
+
+    def clear(self):
+        with self.pending_lock:
+            self.pending = {}
+        with self.connect() as conn:
+            conn.execute('DELETE FROM entries')
+            conn.execute('DELETE FROM counters')
+
+
+    def stats(self):
+        '''
+        returns the hits, misses and cost_saved counters and the number of entries \
+        (the counters of the other processes are the ones they flushed)
+        '''
+        with self.connect() as conn:
+            self.flush(conn)
+            stats = {'hits': 0, 'misses': 0, 'cost_saved': 0}
+            stats.update(dict(conn.execute('SELECT name, value FROM counters')))
+            stats['entries'] = conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+        return stats
+
+
+
+class MemoryCache():
+    '''
+    key / value cache in the memory of the process, with the same ttl and \
+    least recently used eviction as SQLiteCache
+    keys are JSON serializable objects, values are stored as they are
+    '''
+
+    def __init__(self, ttl = 3600, max_entries = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.counters = {'hits': 0, 'misses': 0}
+        self.lock = threading.Lock()
+
+
+    def get(self, key, default = None):
+        '''
+        returns the value stored for key, default if it is missing or expired
+        '''
+        key = json.dumps(key)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[1] + self.ttl < time.time():
+                if entry is not None:
+                    del self.entries[key]
+                self.counters['misses'] += 1
+                return default
+            self.entries.move_to_end(key)
+            self.counters['hits'] += 1
+            return entry[0]
+
+
+    def set(self, key, value):
+        with self.lock:
+            key = json.dumps(key)
+            self.entries[key] = (value, time.time())
+            self.entries.move_to_end(key)
+            # least recently used eviction
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last = False)
+
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+    def stats(self):
+        '''
+        returns the hits and misses counters and the number of entries
+        '''
+        with self.lock:
+            return dict(self.counters, entries = len(self.entries))
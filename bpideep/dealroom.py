@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+
+URL = 'https://api.dealroom.co/api/v1'
+
+
+def get_api_key():
+    '''
+    reads the DealRoom api key from the .env file of the package
+    '''
+    env_path = os.path.join(os.path.dirname(__file__), '.env')
+    load_dotenv(dotenv_path = env_path)
+    return os.getenv('DEALROOMAPIKEY')
+
+
+
+def split(company_id_list, chunk_size = 50):
+    '''
+    splits a list of ids in chunks of chunk_size ids (the batch endpoint limit)
+    '''
+    return [company_id_list[i:i + chunk_size]
+            for i in range(0, len(company_id_list), chunk_size)]
+
+
+
+class DealRoomClient():
+    '''
+    DealRoom API client:
+    - one requests.Session, its connections are reused across calls and threads
+    - 429 and 5xx answers are retried with an exponential backoff, \
+    or after the Retry-After delay when the API gives one
+    - when the rate limit headers say no call is left, every thread waits \
+    for the reset
+    - batches of ids are fetched with max_workers calls in flight
+    '''
+
+    def __init__(self, api_key = None, url = URL, max_workers = 4, max_retries = 5,
+                 backoff = 1, timeout = 60):
+        self.url = url
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        self.session.auth = (api_key if api_key is not None else get_api_key(), '')
+        adapter = HTTPAdapter(pool_connections = max_workers, pool_maxsize = max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.lock = threading.Lock()
+        self.blocked_until = 0
+
+
+    def wait_rate_limit(self):
+        delay = self.blocked_until - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+
+    def update_rate_limit(self, response):
+        '''
+        blocks the calls until the reset when no call is left
+        X-RateLimit-Reset is read as a timestamp, or as seconds if it is small
+        '''
+        remaining = response.headers.get('X-RateLimit-Remaining')
+        reset = response.headers.get('X-RateLimit-Reset')
+        if remaining is None or reset is None:
+            return
+        try:
+            remaining, reset = int(remaining), float(reset)
+        except ValueError:
+            return
+        if remaining > 0:
+            return
+        if reset < 10**9:
+            reset = time.time() + reset
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, reset)
+
+
+    def retry_delay(self, response, attempt):
+        retry_after = response.headers.get('Retry-After')
+        try:
+            return float(retry_after)
+        except (TypeError, ValueError):
+            return self.backoff * 2 ** attempt
+
+
+    def request(self, method, path, **kwargs):
+        '''
+        sends a request to the API, retrying on 429 and 5xx
+        returns the last response
+        '''
+        kwargs.setdefault('timeout', self.timeout)
+        for attempt in range(self.max_retries + 1):
+            self.wait_rate_limit()
+            response = self.session.request(method, f'{self.url}/{path}', **kwargs)
+            self.update_rate_limit(response)
+            if response.status_code != 429 and response.status_code < 500:
+                return response
+            if attempt < self.max_retries:
+                time.sleep(self.retry_delay(response, attempt))
+        return response
+
+
+    def get_batch(self, company_id_list, fields_list, timeout = None):
+        '''
+        returns the json answer of the companies/batch endpoint: \
+        a dict with the 'items' of the companies, or the error
+        timeout: seconds allowed for each call, the client timeout by default
+        '''
+        response = self.request('GET', 'companies/batch',
+                                params = {'ids': ','.join(company_id_list),
+                                          'fields': ','.join(fields_list)},
+                                timeout = timeout or self.timeout)
+        return response.json()
+
+
+    def get_chunks(self, chunks, fields_list, timeout = None):
+        '''
+        fetches a list of id lists concurrently
+        returns the list of the json answers, in the order of the chunks
+        '''
+        with ThreadPoolExecutor(max_workers = self.max_workers) as executor:
+            return list(executor.map(lambda chunk: self.get_batch(chunk, fields_list, timeout),
+                                     chunks))
+
+
+    def get_batches(self, company_id_list, fields_list, chunk_size = 50, timeout = None):
+        '''
+        splits the ids in chunks of chunk_size and fetches them concurrently
+        returns the list of the json answers, in the order of the chunks
+        '''
+        return self.get_chunks(split(company_id_list, chunk_size), fields_list, timeout)
+
+
+
+default = None
+
+def default_client():
+    '''
+    client shared by the getdata functions, created on first use
+    '''
+    global default
+    if default is None:
+        default = DealRoomClient()
+    return default
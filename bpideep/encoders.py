@@ -1,19 +1,56 @@
-from bpideep.feateng import feat_eng, zip_code
+import pandas as pd
+from bpideep.feateng import feat_eng, feat_eng_cols, feat_eng_array, zip_code, \
+    SIMPLE_FEATURES, KEPT_TAGS, TARGET_ZIP, FEATURE_DTYPE
 from sklearn.base import BaseEstimator, TransformerMixin
 
 
 class FeatEncoder(BaseEstimator, TransformerMixin):
-    def __init__(self):
+    '''
+    sparse: the features are a scipy csr matrix instead of a dataframe, \
+    the columns being features_list
+    kept_tags: the tag columns, KEPT_TAGS by default (see feat_eng_cols)
+    '''
+    def __init__(self, sparse = False, kept_tags = None):
         self.features_list = None
+        self.sparse = sparse
+        self.kept_tags = kept_tags
 
 
     def fit(self, X, y=None):
+        self.fit_transform(X, y)
         return self
 
+    def fit_transform(self, X, y=None):
+        '''
+        learns the features order and the vocabulary: the kept tags \
+        that appear in X, every other tag is 0 at transform time
+        the features of X are computed once for fit and transform
+        '''
+        if self.sparse:
+            # no dataframe of the tags: the vocabulary is read in the matrix
+            self.features_list = SIMPLE_FEATURES + list(self.kept_tags or KEPT_TAGS)
+            tags = self.features_list[len(SIMPLE_FEATURES):]
+            features = feat_eng_array(X, self.features_list, tags, sparse = True)
+            seen = features[:, len(SIMPLE_FEATURES):].getnnz(axis = 0) > 0
+            self.vocabulary_ = [tag for tag, found in zip(tags, seen) if found]
+            return features
+
+        X, self.features_list = feat_eng_cols(X, kept_tags = self.kept_tags)
+        tags = self.features_list[len(SIMPLE_FEATURES):]
+        self.vocabulary_ = [tag for tag in tags if (X[tag] == 1).any()]
+        return pd.DataFrame(X.to_numpy(dtype = FEATURE_DTYPE), columns = self.features_list)
+
     def transform(self, X, y=None):
-        X = feat_eng(X)
-        self.features_list = X.columns.tolist()
-        return X
+        if getattr(self, 'vocabulary_', None) is None:
+            # fitted before the vocabulary was learnt: features of X as they come
+            X = feat_eng(X)
+            self.features_list = X.columns.tolist()
+            return X
+        # fixed width, whatever the tags of X
+        if getattr(self, 'sparse', False):
+            return feat_eng_array(X, self.features_list, self.vocabulary_, sparse = True)
+        features = feat_eng_array(X, self.features_list, self.vocabulary_)
+        return pd.DataFrame(features, columns = self.features_list)
 
 
 class LabFeatEncoder(BaseEstimator, TransformerMixin):
@@ -22,8 +59,17 @@ class LabFeatEncoder(BaseEstimator, TransformerMixin):
 
 
     def fit(self, X, y=None):
+        '''
+        freezes the features order and the target zip codes
+        '''
+        self.features_list_ = ['doctor_yesno', 'nb_patents', 'department']
+        self.target_zip_ = list(TARGET_ZIP)
         return self
 
     def transform(self, X, y=None):
-        X = zip_code(X)
-        return X
+        X = zip_code(X, target_zip = getattr(self, 'target_zip_', TARGET_ZIP))
+        if getattr(self, 'features_list_', None) is None:
+            # fitted before the features order was frozen
+            return X
+        return pd.DataFrame(X[self.features_list_].to_numpy(dtype = float),
+                            columns = self.features_list_)
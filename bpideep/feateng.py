@@ -1,13 +1,53 @@
 import pandas as pd
-import matplotlib.pyplot as plt
 import ast
+import itertools
 import os
+from functools import lru_cache
 import numpy as np
+import scipy.sparse as sp
 from bpideep.list import list_industries,list_technologies,list_tags,list_background_team,list_degree_team,list_income_streams,list_investors_name,list_investor_type
 
 data_path = os.path.join(os.path.dirname(__file__), "data")
-patents_df = pd.read_csv(f"{data_path}/patents.csv")
-IDZIP_DF = pd.read_csv(f"{data_path}/id_zip.csv", delimiter = ';')
+
+
+# the static lookups are read on first use, once per process \
+# (before the fork with gunicorn preload_app if the app uses them at import)
+@lru_cache(maxsize = None)
+def load_patents():
+    '''
+    patents.csv: number of patents by DealRoom id
+    '''
+    return pd.read_csv(f"{data_path}/patents.csv")
+
+
+
+@lru_cache(maxsize = None)
+def load_idzip():
+    '''
+    id_zip.csv: ZIP codes by DealRoom id, some ids having several
+    '''
+    return pd.read_csv(f"{data_path}/id_zip.csv", delimiter = ';')
+
+
+
+@lru_cache(maxsize = None)
+def patents_by_id():
+    '''
+    nb_patents series indexed by DealRoom id (the ids of patents.csv are unique)
+    '''
+    patents_df = load_patents()
+    return patents_df.drop_duplicates('id').set_index('id')['nb_patents']
+
+
+
+@lru_cache(maxsize = None)
+def zip_department_by_id():
+    '''
+    {id: 2 first digits of its first ZIP in id_zip.csv}, 0 for a 0 ZIP
+    '''
+    idzip_df = load_idzip()
+    return {id_: int(str(ZIP)[0:2] if ZIP != 0 else 0)
+            for id_, ZIP in zip(idzip_df['id'][::-1], idzip_df['ZIP'][::-1])}
 
 KEPT_TAGS = [
             'technical_background',
@@ -23,41 +63,103 @@ KEPT_TAGS = [
 
 TARGET_ZIP = [91, 38, 87, 35, 67]
 
+# year the age of the companies is computed at (year_of_existence)
+REFERENCE_YEAR = 2020
+
+# features that are not one hot encoded, first columns of feat_eng
+SIMPLE_FEATURES = ['doctor_yesno',
+                   'funding_employees_ratio',
+                   'has_strong_founder',
+                   'has_super_founder',
+                   'stage_age_ratio',
+                   'nb_patents']
+
+# DealRoom fields read by the feature engineering of the three models
+RAW_FIELDS = ['id', 'team', 'industries', 'investors', 'tags', 'income_streams',
+              'technologies', 'growth_stage', 'launch_year', 'has_strong_founder',
+              'has_super_founder', 'total_funding_source', 'employees_latest',
+              'hq_locations']
+
+# dtype contract of the feat_eng_cols columns: the 0 / 1 indicators \
+# (the tags included) are uint8, the ratios and counts float32, np.nan when unknown
+INDICATOR_FEATURES = ['doctor_yesno', 'has_strong_founder', 'has_super_founder']
+INDICATOR_DTYPE = np.uint8
+FEATURE_DTYPE = np.float32
+
+# list columns that are one hot encoded, in the order of the features
+ENCODED_COLUMNS = ['tags',
+                   'background',
+                   'industry',
+                   'degree',
+                   'income_streams',
+                   'technologies',
+                   'investors_name',
+                   'investors_type']
+
 def return_list(data, column):
-    list_ = []
-    data_ = data[column]
-    for row in data_:
-        for elt in row:
-            elt_tagged = f"{elt}_{column}"
-            if elt_tagged not in list_:
-                list_.append(elt_tagged)
-    return list_
+    '''
+    returns the f"{value}_{column}" names of the distinct values \
+    of a list column, in order of first appearance
+    '''
+    return list(dict.fromkeys(f"{elt}_{column}" for row in data[column] for elt in row))
 
 
 
-def encoder(data, column):
+def encoder(data, column, sparse = False, columns = None):
     '''
     encoder function that takes a pandas dataframe (data) \
     and a column name (str) as parameters
-    returns a new_df with one hot encoded columns
+    returns a new_df with one hot encoded columns, \
+    or a (scipy csr matrix, columns list) tuple if sparse is True
+    columns: if given, only these columns are computed (and always returned, \
+    a column whose value never appears in data being all zeros)
+
+    a column f"{value}_{column}" flags the rows whose list contains \
+    f"{value}_{column}".strip(f"_{column}"): str.strip removes the characters \
+    of "_{column}" (not the suffix) from both ends, e.g. 'saas_tags' looks \
+    for '' and 'energy_industry' for 'energ', so such columns are always 0
     '''
     list_ = return_list(data, column)
+    present = set(list_)
+    if columns is not None:
+        list_ = list(columns)
     # if the list_ is empty, return an empty dataframe
     if len(list_) == 0:
+        if sparse:
+            return sp.csr_matrix((len(data), 0), dtype = INDICATOR_DTYPE), list_
         return pd.DataFrame()
-    data_encoded = pd.DataFrame(columns = list_)
-    for index, row in data.iterrows():
-        data_ = row[column]
-        dict_ = {}
-        for tag in list_:
-            tag_strip = tag.strip(f"_{column}")
-            if tag_strip in data_:
-                encoder = 1
-            else:
-                encoder = 0
-            dict_[tag] = encoder
-        data_encoded.loc[index] = dict_
-    return data_encoded
+
+    if len(present) == 0:
+        data_encoded = sp.csr_matrix((len(data), len(list_)), dtype = INDICATOR_DTYPE)
+        if sparse:
+            return data_encoded, list_
+        return pd.DataFrame(data_encoded.toarray(), index = data.index, columns = list_)
+
+    rows = data[column].tolist()
+    lengths = np.fromiter((len(row) for row in rows), dtype = np.int64, count = len(rows))
+    values = pd.Series([elt for row in rows for elt in row], dtype = object)
+
+    # (row, distinct value) presence matrix
+    codes, uniques = pd.factorize(values)
+    row_index = np.repeat(np.arange(len(rows)), lengths)
+    found = codes >= 0
+    presence = sp.csr_matrix((np.ones(found.sum(), dtype = np.int64),
+                              (row_index[found], codes[found])),
+                             shape = (len(rows), len(uniques) + 1))
+    presence.sum_duplicates()
+    presence.data[:] = 1
+    presence = presence.astype(INDICATOR_DTYPE)
+
+    # each column reads the presence of its stripped name, \
+    # the extra last column of presence is always 0
+    code_of = {value: code for code, value in enumerate(uniques) if isinstance(value, str)}
+    column_codes = [code_of.get(tag.strip(f"_{column}"), len(uniques))
+                    if tag in present else len(uniques) for tag in list_]
+    data_encoded = presence.tocsc()[:, column_codes].tocsr()
+
+    if sparse:
+        return data_encoded, list_
+    return pd.DataFrame(data_encoded.toarray(), index = data.index, columns = list_)
 
 
 
@@ -204,6 +306,86 @@ def investors_type(x) :
 
 
 
+# features extracted from the nested DealRoom columns by extract_nested, \
+# {feature: source column}
+NESTED_FEATURES = {'background': 'team',
+                   'degree': 'team',
+                   'doctor_yesno': 'team',
+                   'industry': 'industries',
+                   'investors_name': 'investors',
+                   'investors_type': 'investors',
+                   'hq_zip': 'hq_locations',
+                   'has_hq': 'hq_locations'}
+
+# first degrees of a team member that make doctor_yesno 1
+DOCTOR_DEGREES = ['Doctor', 'PhD']
+
+
+
+def extract_nested(data, features):
+    '''
+    walks the nested columns of each company once and returns the requested \
+    NESTED_FEATURES as {feature: one buffer of len(data)}:
+    - background, degree, industry, investors_name, investors_type: lists, \
+    same values as the background, degree, industries, investors_name \
+    and investors_type functions
+    - doctor_yesno: 0 / 1 int array, degree_quant of degree
+    - hq_zip: zip of the first HQ location, None without HQ location
+    - has_hq: bool array
+    only the source columns of the requested features are read
+    '''
+    features = set(features)
+    sources = {NESTED_FEATURES[feature] for feature in features}
+    nb_rows = len(data)
+    columns = [data[source] if source in sources else itertools.repeat(None, nb_rows)
+               for source in ['team', 'industries', 'investors', 'hq_locations']]
+
+    want_background = 'background' in features
+    want_degree = bool(features & {'degree', 'doctor_yesno'})
+    buffers = {feature: [] for feature in features}
+    doctor_yesno = np.zeros(nb_rows, dtype = np.int64)
+    has_hq = np.zeros(nb_rows, dtype = bool)
+
+    for i, (team, industries_, investors, hq_locations) in enumerate(zip(*columns)):
+        if 'team' in sources:
+            backgrounds, degrees = [], []
+            for team_member in team['items']:
+                if want_background:
+                    for tags in team_member['backgrounds']:
+                        backgrounds.append(tags['name'])
+                if want_degree:
+                    universities = team_member['universities']['items']
+                    if universities and universities[0]['degree'] is not None:
+                        degrees.append(universities[0]['degree']['name'])
+            if want_background:
+                buffers['background'].append(backgrounds)
+            if 'degree' in features:
+                buffers['degree'].append(degrees)
+            doctor_yesno[i] = 1 if degrees and degrees[0] in DOCTOR_DEGREES else 0
+
+        if 'industries' in sources:
+            buffers['industry'].append([industry['name'] for industry in industries_])
+
+        if 'investors' in sources:
+            items = investors['items'] if investors['total'] > 0 else []
+            if 'investors_name' in features:
+                buffers['investors_name'].append([item['name'] for item in items])
+            if 'investors_type' in features:
+                buffers['investors_type'].append([item['type'] for item in items])
+
+        if 'hq_locations' in sources:
+            has_hq[i] = len(hq_locations) > 0
+            if 'hq_zip' in features:
+                buffers['hq_zip'].append(hq_locations[0].get('zip') if has_hq[i] else None)
+
+    if 'doctor_yesno' in features:
+        buffers['doctor_yesno'] = doctor_yesno
+    if 'has_hq' in features:
+        buffers['has_hq'] = has_hq
+    return buffers
+
+
+
 def tags_reduction(encoded_dataframe, threshold = 0.02):
     '''
     function that performs a dimension reduction operation: \
@@ -220,8 +402,8 @@ def tags_reduction(encoded_dataframe, threshold = 0.02):
 
 
 
-def substract_date(x):
-    return 2020 - x
+def substract_date(x, reference_year = REFERENCE_YEAR):
+    return reference_year - x
 
 
 
@@ -238,93 +420,204 @@ def return_ratio(x):
 
 
 
-def feat_eng_cols(data):
+def indicator(values):
+    '''
+    vectorized {True: 1, False: 0} map: 1 for the values equal to True, \
+    0 for the values equal to False, np.nan for the others
+    int array if every value is mapped, float array otherwise
+    '''
+    values = np.asarray(values, dtype = object)
+    is_true = values == True  # noqa: E712
+    is_false = values == False  # noqa: E712
+    if (is_true | is_false).all():
+        return is_true.astype(np.int64)
+    return np.where(is_true, 1., np.where(is_false, 0., np.nan))
+
+
+
+def numeric_features(data, reference_year = REFERENCE_YEAR):
+    '''
+    computes the scalar features of data with array operations
+    returns a dict of arrays: funding_employees_ratio, has_strong_founder, \
+    has_super_founder, growth_stage_num, year_of_existence and stage_age_ratio \
+    (growth stage over years of existence, the growth stage when the age is \
+    not positive or unknown, as return_ratio)
+    reference_year: year the years of existence are counted to
+    '''
+    funding = data['total_funding_source'].to_numpy(dtype = float)
+    employees = data['employees_latest'].to_numpy(dtype = float)
+    stage = growth_stage_num(data).to_numpy(dtype = float)
+    year_of_existence = reference_year - data['launch_year'].to_numpy(dtype = float)
+
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        funding_employees_ratio = funding / employees
+        stage_age_ratio = np.where(year_of_existence > 0, stage / year_of_existence, stage)
+
+    return {'funding_employees_ratio': funding_employees_ratio,
+            'has_strong_founder': indicator(data['has_strong_founder']),
+            'has_super_founder': indicator(data['has_super_founder']),
+            'growth_stage_num': stage,
+            'year_of_existence': year_of_existence,
+            'stage_age_ratio': stage_age_ratio}
+
+
+
+
+def tag_column(tag):
+    '''
+    returns the encoded column a tag comes from, \
+    e.g. 'fund_investors_type' comes from 'investors_type'
+    '''
+    columns = [column for column in ENCODED_COLUMNS if tag.endswith(f"_{column}")]
+    if len(columns) == 0:
+        raise ValueError(f'{tag} does not end with an encoded column name')
+    return max(columns, key = len)
+
+
+
+def all_tags(data):
+    '''
+    returns the f"{value}_{column}" names of every value of the ENCODED_COLUMNS \
+    in data: the widest kept_tags, beyond KEPT_TAGS
+    '''
+    nested = extract_nested(data, [column for column in ENCODED_COLUMNS
+                                   if column in NESTED_FEATURES])
+    data = data.assign(**nested)
+    return [tag for column in ENCODED_COLUMNS for tag in return_list(data, column)]
+
+
+
+def add_features(data, kept_tags, reference_year = REFERENCE_YEAR):
+    '''
+    adds the simple features, and the list features the kept_tags come from, \
+    as columns of data
+    returns the kept_tags grouped by list column
+    '''
+    tags_by_column = {}
+    for tag in kept_tags:
+        tags_by_column.setdefault(tag_column(tag), []).append(tag)
+
+    # nested features, in a single pass: degree is needed for doctor_yesno, \
+    # the list features are only extracted when one of their tags is kept
+    nested = ['degree', 'doctor_yesno'] + [column for column in tags_by_column
+                                           if column in NESTED_FEATURES]
+    for feature, values in extract_nested(data, nested).items():
+        data[feature] = values
+
+    # new features in data as columns
+    for feature, values in numeric_features(data, reference_year).items():
+        data[feature] = values
+
+    return tags_by_column
+
+
+
+def feature_dtypes(columns):
+    '''
+    returns the {column: dtype} contract of feature columns: \
+    INDICATOR_DTYPE for the indicators and tags, FEATURE_DTYPE otherwise
+    '''
+    return {column: FEATURE_DTYPE if column in SIMPLE_FEATURES
+            and column not in INDICATOR_FEATURES else INDICATOR_DTYPE
+            for column in columns}
+
+
+
+def enforce_dtypes(features):
+    '''
+    casts the columns of the features dataframe to their feature_dtypes
+    an indicator column with missing values (e.g. a founder flag DealRoom \
+    does not give) is cast to FEATURE_DTYPE instead, keeping them as np.nan \
+    for the imputer of the model, as the baseline did
+    raises ValueError if an indicator column has a value other than 0, 1 \
+    and np.nan, which the cast would corrupt
+    '''
+    dtypes = feature_dtypes(features.columns)
+    for column, dtype in dtypes.items():
+        values = features[column]
+        if dtype != INDICATOR_DTYPE:
+            continue
+        missing = values.isna()
+        if not ((values == 0) | (values == 1) | missing).all():
+            raise ValueError(f'{column} is an indicator with values other than 0, 1 and NaN')
+        if missing.any():
+            dtypes[column] = FEATURE_DTYPE
+    return features.astype(dtypes)
+
+
+
+def feat_eng_cols(data, kept_tags = None, reference_year = REFERENCE_YEAR):
     '''
     takes a pandas df as input
     global feature engineering function that performs all above mentioned \
     transformations and returns a new dataframe
+    kept_tags: encoded columns to return, KEPT_TAGS by default; only these \
+    indicator columns are computed instead of encoding every tag
+    reference_year: year the ages of the companies are computed at
+    the columns follow the dtype contract of feature_dtypes, the indicators \
+    with missing values being FEATURE_DTYPE (see enforce_dtypes)
     '''
 
-    # new features in data as columns
-    data['background'] = data['team'].map(lambda x:background(x))
-    data['degree'] = data['team'].map(lambda x:degree(x))
-    data['doctor_yesno'] = data['degree'].map(lambda x: degree_quant(x))
-    data['funding_employees_ratio'] = funding_amounts_employees(data)
-    data['has_strong_founder'] = data['has_strong_founder'].map({True : 1,
-                                                                False : 0})
-    data['has_super_founder'] = data['has_super_founder'].map({True : 1,
-                                                               False : 0})
-    data['growth_stage_num'] = growth_stage_num(data)
-    data['industry'] = data['industries'].map(lambda x: industries(x))
-
-    data['year'] = pd.DataFrame({'year': data['launch_year']})
-    data['year_of_existence'] = data['year'].map(lambda x : substract_date(x))
-    data['stage_age_ratio'] = data[['year_of_existence','growth_stage_num']]\
-                                .apply(return_ratio,axis=1)
-    data['investors_name'] = data['investors'].map(lambda x:investors_name(x))
-    data['investors_type'] = data['investors'].map(lambda x:investors_type(x))
-
-
-    # encoded features
-    background_team_encoded_df = encoder(data, 'background')
-    degree_team_encoded_df = encoder(data,'degree')
-    industries_encoded_df = encoder(data,'industry')
-    income_streams_encoded_df = encoder(data,'income_streams')
-    technologies_encoded_df = encoder(data,'technologies')
-    tags_encoded_df = encoder(data,'tags')
-    investors_name_encoded_df = encoder(data, 'investors_name')
-    investors_type_encoded_df = encoder(data, 'investors_type')
-
-    # processed encoded features
-    # tags_retained = tags_reduction(tags_encoded_df, threshold = 0)
-    # background_retained = tags_reduction(background_team_encoded_df, threshold = 0)
-    # industries_retained = tags_reduction(industries_encoded_df, threshold = 0)
-    # investors_name_retained = tags_reduction(investors_name_encoded_df, threshold = 0)
+    # selection of columns to keep
+    if kept_tags is None:
+        kept_tags = KEPT_TAGS
+    tags_by_column = add_features(data, kept_tags, reference_year)
+
+    # encoded features: only the kept indicator columns
+    encoded_dfs = [encoder(data, column, columns = tags_by_column[column])
+                   for column in ENCODED_COLUMNS if column in tags_by_column]
 
     # to concat
-    concat_df = pd.concat([
-                        data[['id',
-                            'doctor_yesno',
-                            'funding_employees_ratio',
-                            'has_strong_founder',
-                            'has_super_founder',
-                            'stage_age_ratio'
-                            ]],
-                        tags_encoded_df,
-                        background_team_encoded_df,
-                        industries_encoded_df,
-                        degree_team_encoded_df,
-                        income_streams_encoded_df,
-                        technologies_encoded_df,
-                        investors_name_encoded_df,
-                        investors_type_encoded_df
-                        ], axis = 1)
-
-    # merge concat_df with patents to get patents info
-    concat_df = concat_df.merge(patents_df[['nb_patents', 'id']], on = 'id', how = 'left')
-
-    # we keep a trace of all features list (by group of features)
-    simple_features = ['doctor_yesno',
-                        'funding_employees_ratio',
-                        'has_strong_founder',
-                        'has_super_founder',
-                        'stage_age_ratio',
-                        'nb_patents']
+    concat_df = pd.concat([data[['id'] + SIMPLE_FEATURES[:-1]]] + encoded_dfs, axis = 1)
 
+    # patents info: the ids of patents.csv are unique, \
+    # same values as a left merge on 'id'
+    concat_df['nb_patents'] = concat_df['id'].map(patents_by_id())
+    concat_df.reset_index(drop = True, inplace = True)
+
+    kept_cols = SIMPLE_FEATURES + list(kept_tags)
+
+    return enforce_dtypes(concat_df[kept_cols]), kept_cols
 
-    # selection of columns to keep
-    kept_tags = KEPT_TAGS
 
-    # necessary check that all kept_tags are in concat_df columns:
-    # useful in case new entry data is given and some tags of industries differ
-    no_tags = [col for col in kept_tags if col not in concat_df.columns]
-    if len(no_tags) != 0:
-        for col in no_tags:
-            concat_df[col] = 0
 
-    kept_cols = simple_features + kept_tags
+def feat_eng_array(data, features_list, vocabulary, reference_year = REFERENCE_YEAR,
+                   sparse = False):
+    '''
+    computes the features_list columns (the SIMPLE_FEATURES and tags, \
+    as returned by feat_eng_cols) straight into a preallocated float array
+    vocabulary: the tags that can be 1 (e.g. the tags seen when fitting), \
+    the other tag columns are left to 0
+    returns a (len(data), len(features_list)) FEATURE_DTYPE numpy array, \
+    or a scipy csr matrix if sparse is True: the tag columns are never densified
+    '''
+    vocabulary = set(vocabulary)
+    kept_tags = [tag for tag in features_list[len(SIMPLE_FEATURES):] if tag in vocabulary]
+    tags_by_column = add_features(data, kept_tags, reference_year)
+
+    simple = np.column_stack([data[feature].to_numpy(dtype = float)
+                              for feature in SIMPLE_FEATURES[:-1]]
+                             + [data['id'].map(patents_by_id()).to_numpy(dtype = float)])
+    encoded = [encoder(data, column, sparse = True, columns = tags)
+               for column, tags in tags_by_column.items()]
+
+    if sparse:
+        # blocks side by side, then their columns in the features_list order
+        columns = SIMPLE_FEATURES + [tag for _, tags in encoded for tag in tags]
+        unseen = [feature for feature in features_list if feature not in set(columns)]
+        blocks = [sp.csr_matrix(simple)] + [data_encoded for data_encoded, _ in encoded] \
+            + [sp.csr_matrix((len(data), len(unseen)))]
+        position = {feature: j for j, feature in enumerate(columns + unseen)}
+        features = sp.hstack(blocks, format = 'csc', dtype = FEATURE_DTYPE)
+        return features[:, [position[feature] for feature in features_list]].tocsr()
 
-    return concat_df[kept_cols], kept_cols
+    features = np.zeros((len(data), len(features_list)), dtype = FEATURE_DTYPE)
+    position = {feature: j for j, feature in enumerate(features_list)}
+    features[:, [position[feature] for feature in SIMPLE_FEATURES]] = simple
+    for data_encoded, columns in encoded:
+        features[:, [position[tag] for tag in columns]] = data_encoded.toarray()
+
+    return features
 
 
 
@@ -338,67 +631,78 @@ def feat_eng(data):
     concat_df, kept_cols = feat_eng_cols(data)
     return concat_df
 
-def get_stage_age_ratio(data):
-    data['year'] = pd.DataFrame({'year': data['launch_year']})
-    data['year_of_existence'] = data['year'].map(lambda x : substract_date(x))
-    data['growth_stage_num'] = growth_stage_num(data)
-    data['stage_age_ratio'] = data[['year_of_existence','growth_stage_num']]\
-                                .apply(return_ratio,axis=1)
+def get_stage_age_ratio(data, reference_year = REFERENCE_YEAR):
+    features = numeric_features(data, reference_year)
+    for feature in ['year_of_existence', 'growth_stage_num', 'stage_age_ratio']:
+        data[feature] = features[feature]
     return data['stage_age_ratio']
 
 
-def zip_code(data):
-    # new features in data as columns
-    # import ipdb; ipdb.set_trace()
-    data['degree'] = data['team'].map(lambda x:degree(x))
-    data['doctor_yesno'] = data['degree'].map(lambda x: degree_quant(x))
+def convert(string):
+    '''
+    2 first digits of a zip code string, -1000 if it is not a number
+    '''
+    try:
+        int(string)
+        n = string[0:2]
+        n = int(n)
+    except:
+        n = -1000
+    return n
 
-    # merge concat_df with patents to get patents info
-    if 'nb_patents' not in data.columns.tolist():
-        data = data.merge(patents_df[['nb_patents', 'id']], on = 'id', how = 'left')
 
-    simple_features = ['id',
-                        'hq_locations',
-                        'doctor_yesno',
-                        'nb_patents']
 
-    data = data[simple_features]
-
-    idzip_df = IDZIP_DF.copy()
-    idzip_df.set_index('id', inplace = True)
-    hq_locations = data[['id', 'hq_locations']]
-    def getzip(elt):
-        if len(elt) == 0:
-            return None
-        else:
-            return elt[0]
-    hq_locations['hq_locations'] = hq_locations['hq_locations'].apply(lambda x: getzip(x))
-    hq_locations = hq_locations.dropna(axis=0, subset=['hq_locations'])
-    hq_df = pd.DataFrame(hq_locations['hq_locations'].to_list(), index=hq_locations['id'])
-    hq_df = hq_df[['zip']]
-    merged = hq_df.join(idzip_df).fillna(value = -1000)
-    merged_clean = merged
-    def convert(string):
-        try:
-            int(string)
-            n = string[0:2]
-            n = int(n)
-        except:
-            n = -1000
-        return n
-    merged_clean.zip = merged_clean.zip.apply(lambda x : convert(x))
-    merged_clean.ZIP = merged_clean.ZIP.apply(lambda x : int(str(x)[0:2] if x != 0 else 0))
-    merged_clean['zip_code'] = merged_clean.apply(max, axis = 1)
-    final = merged_clean.drop(columns=['zip', 'ZIP'])
-    df = data.set_index('id').join(final, how = 'left').fillna(value = -1)
-    df['zip_code'] = df['zip_code'].astype('int')
-    df.reset_index(inplace = True, drop = True)
-    df['department'] = df['zip_code'].apply(lambda x: 1 if (x in TARGET_ZIP) else 0)
-    df.drop(columns = ['zip_code'], inplace = True)
+def convert_zips(zips):
+    '''
+    convert of a sequence of zip codes, as an int array
+    zip codes repeat a lot: each distinct value is converted once
+    '''
+    codes, uniques = pd.factorize(pd.Series(list(zips), dtype = object))
+    # the last value is for the missing zip codes (code -1)
+    converted = np.array([convert(zip_) for zip_ in uniques] + [convert(None)], dtype = np.int64)
+    return converted[codes]
 
-    return df
+
+
+def department(data, target_zip = TARGET_ZIP, nested = None):
+    '''
+    returns a 0 / 1 array: whether the department of the company, \
+    the 2 first digits of its HQ zip code or of its id_zip.csv ZIP \
+    (the highest of both), is in target_zip
+    companies without HQ location are 0
+    an id with several ZIP in id_zip.csv keeps the first one
+    nested: extract_nested buffers with 'hq_zip' and 'has_hq', if already extracted
+    '''
+    if nested is None:
+        nested = extract_nested(data, ['hq_zip', 'has_hq'])
+    has_hq = nested['has_hq']
+    hq_departments = convert_zips(nested['hq_zip'])
+
+    # a missing ZIP is read as -1000, hence '-1'
+    id_departments = data['id'].map(zip_department_by_id()).fillna(-1).to_numpy(dtype = np.int64)
+
+    zip_codes = np.where(has_hq, np.maximum(hq_departments, id_departments), -1)
+    return np.isin(zip_codes, target_zip).astype(int)
 
 
 
+def zip_code(data, target_zip = TARGET_ZIP):
+    # new features in data as columns, the team and HQ locations \
+    # being walked once
+    nested = extract_nested(data, ['degree', 'doctor_yesno', 'hq_zip', 'has_hq'])
+    data['degree'] = nested['degree']
+    data['doctor_yesno'] = nested['doctor_yesno']
 
+    # patents info
+    if 'nb_patents' not in data.columns.tolist():
+        data = data.assign(nb_patents = data['id'].map(patents_by_id()))
+
+    simple_features = ['hq_locations',
+                        'doctor_yesno',
+                        'nb_patents']
 
+    df = data[simple_features].fillna(value = -1)
+    df.reset_index(inplace = True, drop = True)
+    df['department'] = department(data, target_zip, nested)
+
+    return df
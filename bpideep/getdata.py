@@ -10,6 +10,10 @@ from dotenv import load_dotenv, find_dotenv
 import os
 import json
 
+from bpideep.dealroom import default_client, split
+from bpideep.searchcache import CompanySearchCache
+from bpideep.snapshot import PARQUET, SNAPSHOT_PATH, read_snapshot, write_snapshot
+
 
 
 def company_tolist(id_csv_file):
@@ -84,97 +88,151 @@ def getjson(deeptech_id_csv, non_deeptech_id_csv, almost_deeptech_id_csv):
 
 
 
-def getbatchdata(company_id_list, fields_list):
+def items_df(answer):
+    """
+    returns the 'items' of a DealRoom json answer as a pandas dataframe, \
+    or the answer itself if it has no items (api error)
+    """
+    try :
+        data = answer['items']
+    except:
+        return answer
+
+    return pd.DataFrame(data)
+
+
+
+def answer_items(answer):
+    """
+    returns the list of the 'items' of a DealRoom json answer
+    raises a ValueError with the answer if it has no items (api error)
+    """
+    try :
+        return answer['items']
+    except (KeyError, TypeError):
+        raise ValueError(f'DealRoom batch call failed: {answer}')
+
+
+
+def getbatchdata(company_id_list, fields_list, client = None):
     """
     takes a company_id_list and a fields parameter, \
     which is a list of fields for the Dealroom API
     returns a pandas dataframe with each row corresponding to a company \
     and the columns corresponding to the fields list
-
-    this function is called in getfulldata
+    client: DealRoomClient to use, the shared one by default
     """
 
     assert isinstance(company_id_list, list)
 
-    # stores env_path for api key in .env file
-    env_path = os.path.join(os.path.dirname(__file__), '.env')
-    load_dotenv(dotenv_path = env_path)
-    APIKEY = os.getenv('DEALROOMAPIKEY')
-    URL = 'https://api.dealroom.co/api/v1'
-
-    # converts the company_id_list and fields_list to strings \
-    # of company ids and fields separated by commas
-    companies_string = ','.join(company_id_list)
-    fields_string = ','.join(fields_list)
+    client = client or default_client()
 
     # performs get request on dealroom api
-    response = requests.get(
-                        url = f'{URL}/companies/batch?ids={companies_string}&fields={fields_string}',\
-                        auth = (APIKEY, '')
-                        )
-    try :
-        data = response.json()['items']
-    except:
-        data = response.json()
-        return data
+    return items_df(client.get_batch(company_id_list, fields_list))
 
-    return pd.DataFrame(data)
 
 
+# compact dtypes of the DealRoom fields: strings of few distinct values \
+# as categories, flags as bool, counts and years in float32 (exact below 2**24)
+CATEGORY_FIELDS = ['growth_stage', 'company_status', 'employees', 'deep_or_not']
+FLAG_FIELDS = ['has_strong_founder', 'has_super_founder']
+FLOAT32_FIELDS = ['employees_latest', 'launch_year', 'launch_month']
 
-def getfulldata(company_dict, fields_txt_file):
+
+def compact_dtypes(data):
     """
-    takes the json object generated with getjson, and the fields_txt_file as parameters \
-    makes three API calls with companies id
+    casts in place the columns of data to compact dtypes instead of object \
+    and float64 ones: the CATEGORY_FIELDS (if only strings), the FLAG_FIELDS \
+    (if no value is missing), the FLOAT32_FIELDS and the uint8 'target'
+    returns data
     """
+    for column in CATEGORY_FIELDS:
+        if column in data and data[column].dropna().map(type).eq(str).all():
+            data[column] = data[column].astype('category')
+    for column in FLAG_FIELDS:
+        if column in data and data[column].isin([True, False]).all():
+            data[column] = data[column].astype(bool)
+    for column in FLOAT32_FIELDS:
+        if column in data and pd.api.types.is_numeric_dtype(data[column]):
+            data[column] = data[column].astype(np.float32)
+    if 'target' in data:
+        data['target'] = data['target'].astype(np.uint8)
+    return data
 
-    # storing the fields in a list
-    fields_list = fields_tolist(fields_txt_file)
 
-    # instantiating empty dataframes to store API calls results
-    deep_df = pd.DataFrame(columns = fields_list)
-    nondeep_df = pd.DataFrame(columns = fields_list)
-    almostdeep_df = pd.DataFrame(columns = fields_list)
 
-    df_dict = {'deeptech': deep_df, \
-                'non_deeptech':nondeep_df, \
-                'almost_deeptech':almostdeep_df}
+def answers_data(labelled_answers, fields_list):
+    """
+    takes (company_type, json answer) pairs of batch calls and the fields list
+    returns the dataframe of the companies with the 'deep_or_not' and 'target' \
+    columns, without duplicates (a company keeps its first label), \
+    in compact dtypes (see compact_dtypes)
+    """
 
-    for company_type, id_list in company_dict.items():
+    # the raw items are collected in lists and the dataframe is built once \
+    # (concatenating a frame per batch copies everything fetched so far every time)
+    items_dict = {'deeptech': [], 'non_deeptech': [], 'almost_deeptech': []}
+    for company_type, answer in labelled_answers:
+        items_dict[company_type].extend(answer_items(answer))
+
+    # creating the 'deep_or_not' and 'target' columns
+    items = []
+    for company_type, company_items in items_dict.items():
+        target = 1 if company_type == 'deeptech' else 0
+        for item in company_items:
+            item['deep_or_not'] = company_type
+            item['target'] = target
+        items.extend(company_items)
+
+    data = pd.DataFrame(items)
+    data = data.reindex(columns = fields_list + [column for column in data.columns
+                                                 if column not in fields_list])
 
-        chunks = (len(id_list) - 1) // 50 + 1
-        for i in range(chunks):
-            batch = id_list[i*50:(i+1)*50]
-            data_i = getbatchdata(batch, fields_list)
-            df_dict[company_type] = pd.concat([df_dict[company_type], data_i], \
-                                                axis=0, sort = False)
+    # drop duplicates
+    data.drop_duplicates(subset = 'id', inplace = True)
+    data.reset_index(drop = True, inplace = True)
 
-    deep_df = df_dict['deeptech']
-    nondeep_df = df_dict['non_deeptech']
-    almostdeep_df = df_dict['almost_deeptech']
+    return compact_dtypes(data)
 
-    # creating the 'deep_or_not' column
-    deep_df['deep_or_not'] = 'deeptech'
-    nondeep_df['deep_or_not'] = 'non_deeptech'
-    almostdeep_df['deep_or_not'] = 'almost_deeptech'
 
-    # creating the 'target' column
-    deep_df['target'] = 1
-    nondeep_df['target'] = 0
-    almostdeep_df['target'] = 0
 
-    # concatenates the three dataframes
-    data = pd.concat([deep_df, nondeep_df, almostdeep_df], axis = 0, ignore_index = True)
+def getfulldata(company_dict, fields_txt_file, client = None, store = None):
+    """
+    takes the json object generated with getjson, and the fields_txt_file as parameters \
+    fetches the companies of every label by batches of 50 ids, \
+    several batches being in flight at once (see DealRoomClient)
+    store: RawStore to read the companies from, only the new and stale \
+    ones being fetched from DealRoom
+    the companies are saved as the rawdata/data.parquet snapshot \
+    (rawdata/data.csv without pyarrow)
+    """
 
-    # drop duplicates
-    data.drop_duplicates(subset = 'id', inplace = True)
-    data.reset_index(drop = True, inplace = True)
+    # storing the fields in a list
+    fields_list = fields_tolist(fields_txt_file)
+
+    if store is not None:
+        labelled_answers = store.answers(company_dict, fields_list)
+    else:
+        client = client or default_client()
+
+        # the chunks of every label are fetched together
+        chunks = [(company_type, chunk) for company_type, id_list in company_dict.items()
+                  for chunk in split(id_list, 50)]
+        answers = client.get_chunks([chunk for company_type, chunk in chunks], fields_list)
+        labelled_answers = zip([company_type for company_type, chunk in chunks], answers)
+
+    data = answers_data(labelled_answers, fields_list)
 
     X = data.drop(columns = 'target')
     y = data['target']
 
-    output_path = os.path.join(os.path.dirname(__file__), "rawdata")
-    data.to_csv(f'{output_path}/data.csv', index = False)
+    # parquet keeps the nested fields (see read_snapshot and snapshot_data), \
+    # the csv flattens them to python reprs
+    if PARQUET:
+        write_snapshot(data, SNAPSHOT_PATH)
+    else:
+        output_path = os.path.join(os.path.dirname(__file__), "rawdata")
+        data.to_csv(f'{output_path}/data.csv', index = False)
 
     return X, y
 
@@ -182,16 +240,20 @@ def get_df(deep_csv, nondeep_csv, almostdeep_csv):
     """ takes the three csv files names as arguments and concat the df, \
     returns a df
     adds a 'deep_or_not' column
-    adds a 0 or 1 column (1 for deep, 0 for nondeep or almost deep) """
+    adds a 0 or 1 column (1 for deep, 0 for nondeep or almost deep)
+    .parquet files are read with read_snapshot, their nested fields kept, \
+    and the result is then written as parquet too """
 
     # stores the path of each csv file in a variable
     deep_path = os.path.join(os.path.dirname(__file__), 'rawdata/', deep_csv)
     nondeep_path = os.path.join(os.path.dirname(__file__), 'rawdata/', nondeep_csv)
     almostdeep_path = os.path.join(os.path.dirname(__file__), 'rawdata/', almostdeep_csv)
 
-    deep = pd.read_csv(deep_path)
-    nondeep = pd.read_csv(nondeep_path)
-    almostdeep = pd.read_csv(almostdeep_path)
+    parquet = deep_csv.endswith('.parquet')
+    read = read_snapshot if parquet else pd.read_csv
+    deep = read(deep_path)
+    nondeep = read(nondeep_path)
+    almostdeep = read(almostdeep_path)
 
     # creating the 'deep_or_not' column
     deep['deep_or_not'] = 'deeptech'
@@ -207,11 +269,19 @@ def get_df(deep_csv, nondeep_csv, almostdeep_csv):
         data = pd.concat([deep, nondeep, almostdeep], axis = 0, ignore_index = True)
 
     output_path = os.path.join(os.path.dirname(__file__), "rawdata")
-    data.to_csv(f'{output_path}/complete_df.csv')
+    if parquet:
+        write_snapshot(data, f'{output_path}/complete_df.parquet')
+    else:
+        data.to_csv(f'{output_path}/complete_df.csv')
 
     return data
 
-def company_search(name):
+def dealroom_search(name, match_type, timeout = None):
+    """
+    searches a company name on DealRoom, match_type being 'exact' or 'fuzzy'
+    returns a dataframe of the first company found (empty if none), \
+    or the json answer if it has no items (api error)
+    """
     # if local
     env_path = os.path.join(os.path.dirname(__file__), ".env")
     load_dotenv(dotenv_path = env_path)
@@ -224,7 +294,8 @@ def company_search(name):
     response = requests.post(
                         url = URL,\
                         auth = (APIKEY, ''),\
-                        data = {'keyword':name, 'keyword_type':"name", 'keyword_match_type':"exact", 'fields': fields_string})
+                        data = {'keyword':name, 'keyword_type':"name", 'keyword_match_type':match_type, 'fields': fields_string},\
+                        timeout = timeout)
 
     try :
         data = response.json()['items']
@@ -234,28 +305,32 @@ def company_search(name):
 
     return company
 
-def company_search_fuzzy(name):
-    # if local
-    env_path = os.path.join(os.path.dirname(__file__), ".env")
-    load_dotenv(dotenv_path = env_path)
-    APIKEY = os.getenv('DEALROOMAPIKEY')
 
-    URL = 'https://api.dealroom.co/api/v1/companies'
-    fields_list = fields_tolist('fields_list.txt')
-    fields_string = ','.join(fields_list)
+search_cache = None
 
-    response = requests.post(
-                        url = URL,\
-                        auth = (APIKEY, ''),\
-                        data = {'keyword':name, 'keyword_type':"name", 'keyword_match_type':"fuzzy", 'fields': fields_string})
+def get_search_cache():
+    """
+    cache of the DealRoom searches shared by the workers, created on first use
+    """
+    global search_cache
+    if search_cache is None:
+        search_cache = CompanySearchCache()
+    return search_cache
 
-    try :
-        data = response.json()['items']
-        company = pd.DataFrame(data).head(1)
-    except:
-        company = response.json()
+def company_search(name, timeout = None):
+    """
+    exact DealRoom search of a company name, through the search cache
+    """
+    return get_search_cache().search(name, 'exact',
+                                     lambda: dealroom_search(name, 'exact', timeout = timeout))
 
-    return company
+def company_search_fuzzy(name, timeout = None):
+    """
+    fuzzy DealRoom search of a company name, through the search cache \
+    (a company found by an exact search of the name is returned as it is)
+    """
+    return get_search_cache().search(name, 'fuzzy',
+                                     lambda: dealroom_search(name, 'fuzzy', timeout = timeout))
 
 # def bulk_search(**kwargs):
 #     '''Bulk search is for searching multiple company by keywords in the name or the website'''
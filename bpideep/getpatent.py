@@ -1,58 +1,135 @@
+import os
+import threading
 import pandas as pd
 from google.cloud import bigquery
 
+try:
+    # optional: columnar download of the results
+    from google.cloud import bigquery_storage  # noqa: F401
+    import pyarrow  # noqa: F401
+    BQSTORAGE = True
+except ImportError:
+    BQSTORAGE = False
+
+
+# snapshot of the public patents tables that is queried
+SNAPSHOT = '202004'
+
+PATENTS_FROM = ( f'FROM `patents-public-data.patents.publications_{SNAPSHOT}` AS patents '
+                 f'LEFT JOIN `patents-public-data.google_patents_research.publications_{SNAPSHOT}` AS google ON patents.publication_number = google.publication_number ' )
+
+# the company name is sent as the @name query parameter: the statement text \
+# is the same for every company, so repeated names hit the BigQuery cache
+NAME_WHERE = 'WHERE EXISTS(SELECT 1 FROM UNNEST(patents.assignee_harmonized) AS a WHERE a.name = @name)'
+
+# joins every company name of the @names array parameter to the harmonized \
+# assignees of the patents, in a single query: a patent listing a name \
+# several times gives several rows, so the patents are counted DISTINCT
+BULK_FROM = ( f'FROM `patents-public-data.patents.publications_{SNAPSHOT}` AS patents '
+              'CROSS JOIN UNNEST(patents.assignee_harmonized) AS a '
+              'JOIN UNNEST(@names) AS company_name ON a.name = company_name '
+              f'LEFT JOIN `patents-public-data.google_patents_research.publications_{SNAPSHOT}` AS google ON patents.publication_number = google.publication_number ' )
+
 
 class Patent():
     '''Class to get patents from bigquery public patents dataset'''
 
-    def __init__(self):
-        pass
+    # bigquery client shared by every Patent of a process, created on first use
+    shared_client = None
+    shared_client_pid = None
+    shared_client_lock = threading.Lock()
+
+    def __init__(self, client=None, cache=None, dry_run=False):
+        '''client: bigquery client to use instead of the shared one
+           cache: optional PatentCache (bpideep.patentcache) in front of the patent counts
+           dry_run: estimate and print the bytes scanned by each query before running it'''
+        self.client = client
+        self.cache = cache
+        self.dry_run = dry_run
+        self.bytes_estimates = []
+
+    def get_client(self):
+        '''returns the bigquery client, the shared one is created once per process
+           (the clients are thread-safe but must not cross a fork)'''
+        if self.client is not None:
+            return self.client
+        cls = Patent
+        if cls.shared_client is None or cls.shared_client_pid != os.getpid():
+            with cls.shared_client_lock:
+                if cls.shared_client is None or cls.shared_client_pid != os.getpid():
+                    cls.shared_client = bigquery.Client()
+                    cls.shared_client_pid = os.getpid()
+        return cls.shared_client
+
+    def query(self, sql, query_parameters):
+        '''starts a parameterized query and returns its job
+           in dry_run mode the bytes the query will scan are printed first'''
+        client = self.get_client()
+        if self.dry_run:
+            dry_config = bigquery.QueryJobConfig(query_parameters=query_parameters,
+                                                 dry_run=True, use_query_cache=False)
+            bytes_estimate = client.query(sql, job_config=dry_config).total_bytes_processed
+            self.bytes_estimates.append(bytes_estimate)
+            print(f'query will process {bytes_estimate} bytes')
+        return client.query(sql, job_config=bigquery.QueryJobConfig(query_parameters=query_parameters))
 
     def name_clean(self,column_name):
         '''Clean the name column for Big Query'''
         name_clean = column_name.str.replace('-', ' ').str.replace("'", '').str.upper()
         return name_clean
 
-    def get_bulk_patents(self,data):
-        '''return all patents for companies by searching each companies' names in Big Query
+    def get_bulk_patents(self,data,timeout=None):
+        '''return all patents for companies by searching all companies' names in a single Big Query query
            names needs to be harmonized with name_clean() before using this function'''
-        client = bigquery.Client()
-
-        #Empty df to put every searchings
-        df = pd.DataFrame(columns=['id', 'id_patents', 'country_code', 'harmonized_assignee', 'top_terms', 'nb_similar'])
-
         if 'clean_name' not in data.columns:
             return print('clean_name is not a column of the input dataFrame')
 
-        for i in data.index:
-            name = data.loc[i,'clean_name']
-            ids = data.loc[i,'id']
+        df, counts = self.get_bulk_patents_counts(data, timeout=timeout)
+        return df
+
+    def get_bulk_patents_counts(self,data,timeout=None):
+        '''return all patents for companies and their number of patents, from a single query
+           data needs 'id' and 'clean_name' columns (see name_clean())
+           returns (patents df, counts df with 'id' and 'nb_patents' columns)'''
+        sql = ( 'SELECT company_name, patents.publication_number, patents.country_code, '
+                'ARRAY(SELECT name FROM UNNEST(patents.assignee_harmonized)), '
+                'google.top_terms, (SELECT COUNT(publication_number) FROM UNNEST(google.similar)) AS similar '
+                + BULK_FROM )
 
-            sql = ( 'SELECT patents.publication_number, patents.country_code, ARRAY(SELECT name FROM UNNEST(patents.assignee_harmonized)), '
-                    'google.top_terms, (SELECT COUNT(publication_number) FROM UNNEST(google.similar)) AS similar '
-                    'FROM `patents-public-data.patents.publications_202004` AS patents '
-                    'LEFT JOIN `patents-public-data.google_patents_research.publications_202004` AS google ON patents.publication_number = google.publication_number '
-                    f'WHERE "{name}" in UNNEST(ARRAY(SELECT name FROM UNNEST(patents.assignee_harmonized)))' )
+        query = self.query(sql, self.names_parameters(data['clean_name']))
+        results = self.fetch(query, timeout,
+                             ['clean_name', 'id_patents', 'country_code', 'harmonized_assignee', 'top_terms', 'nb_similar'])
 
-            query = client.query(sql)
-            results = query.result()
+        # one row per patent and name, whatever the assignees repeating it
+        results = results.drop_duplicates(subset=['clean_name', 'id_patents'])
 
-            # Dictionnary to add the query's results
-            r_dic = {'id':[], 'id_patents': [],'country_code':[],'harmonized_assignee':[],'top_terms':[],'nb_similar':[] }
+        # every company sharing a name gets the patents of this name
+        df = data[['id', 'clean_name']].merge(results, on='clean_name', how='inner')
+        df = df[['id', 'id_patents', 'country_code', 'harmonized_assignee', 'top_terms', 'nb_similar']]
 
-            for row in results:
-                r_dic['id'].append(ids)
-                r_dic['id_patents'].append(row[0])
-                r_dic['country_code'].append(row[1])
-                r_dic['harmonized_assignee'].append(row[2])
-                r_dic['top_terms'].append(row[3])
-                r_dic['nb_similar'].append(row[4])
+        counts = data[['id']].copy()
+        counts['nb_patents'] = data['id'].map(df.groupby('id').size()).fillna(0).astype(int)
 
-            # Concatenate the query and df
-            r_df = pd.DataFrame.from_dict(r_dic)
-            df = pd.concat([df,r_df])
+        return df, counts
 
-        return df
+    def names_parameters(self, clean_names):
+        '''query parameters sending the names as the @names array'''
+        names = pd.Series(clean_names, dtype=object).dropna().unique().tolist()
+        return [bigquery.ArrayQueryParameter('names', 'STRING', names)]
+
+    def name_parameters(self, clean_name):
+        '''query parameters sending one name as @name'''
+        return [bigquery.ScalarQueryParameter('name', 'STRING', clean_name)]
+
+    def fetch(self, query, timeout, columns):
+        '''waits for the query and returns its results as a df with the given column names,
+           downloaded as Arrow record batches through the Storage Read API when available'''
+        results = query.result(timeout=timeout)
+        if BQSTORAGE:
+            df = results.to_arrow(create_bqstorage_client=True).to_pandas()
+            df.columns = columns
+            return df
+        return pd.DataFrame([tuple(row) for row in results], columns=columns)
 
     def new_companies(self,old_df, new_df):
         ''' Get the names of the new companies added to the dataset'''
@@ -63,15 +140,12 @@ class Patent():
     def get_patents(self, company_name):
         '''Get patents informations for one company '''
         clean_name = company_name.replace('-', ' ').replace("'", '').upper()
-        client = bigquery.Client()
 
         sql = ( 'SELECT patents.publication_number, patents.country_code, ARRAY(SELECT name FROM UNNEST(patents.assignee_harmonized)), '
                 'google.top_terms, (SELECT COUNT(publication_number) FROM UNNEST(google.similar)) AS similar '
-                'FROM `patents-public-data.patents.publications_202004` AS patents '
-                'LEFT JOIN `patents-public-data.google_patents_research.publications_202004` AS google ON patents.publication_number = google.publication_number '
-                f'WHERE "{clean_name}" in UNNEST(ARRAY(SELECT name FROM UNNEST(patents.assignee_harmonized)))' )
+                + PATENTS_FROM + NAME_WHERE )
 
-        query = client.query(sql)
+        query = self.query(sql, self.name_parameters(clean_name))
         results = query.result()
 
         results_dic = { 'id_patents': [],'country_code':[],'harmonized_assignee':[],'top_terms':[],'nb_similar':[] }
@@ -88,30 +162,57 @@ class Patent():
 
         return results_df
 
-    def get_nb_patents(self, company_name):
-        '''Get number of patents for one company '''
+    def get_nb_patents(self, company_name, timeout=None):
+        '''Get number of patents for one company
+           timeout: seconds to wait for the query results'''
         clean_name = company_name.replace('-', ' ').replace("'", '').upper()
-        client = bigquery.Client()
+        if self.cache is not None:
+            n_patents = self.cache.get_nb_patents(clean_name)
+            if n_patents is not None:
+                return n_patents
 
-        sql = ( 'SELECT COUNT(*) '
-                'FROM `patents-public-data.patents.publications_202004` AS patents '
-                'LEFT JOIN `patents-public-data.google_patents_research.publications_202004` AS google ON patents.publication_number = google.publication_number '
-                f'WHERE "{clean_name}" in UNNEST(ARRAY(SELECT name FROM UNNEST(patents.assignee_harmonized)))' )
+        sql = 'SELECT COUNT(*) ' + PATENTS_FROM + NAME_WHERE
 
-        query = client.query(sql)
-        results = query.result()
+        query = self.query(sql, self.name_parameters(clean_name))
+        results = query.result(timeout=timeout)
 
         # results_dic = { 'id_patents': [],'country_code':[],'harmonized_assignee':[],'top_terms':[],'nb_similar':[] }
 
         for row in results:
             n_patents = row[0]
 
+        if self.cache is not None:
+            self.cache.set_nb_patents(clean_name, n_patents, query.total_bytes_processed)
 
         return n_patents
 
+    def get_bulk_nb_patents(self, company_names, timeout=None):
+        '''Get the number of patents of several companies with a single query
+           returns a dict {company_name: nb_patents}, 0 for companies without patents'''
+        names = pd.Series(company_names, dtype=object)
+        clean_names = self.name_clean(names)
 
+        counts = {}
+        if self.cache is not None:
+            for clean_name in clean_names.unique():
+                n_patents = self.cache.get_nb_patents(clean_name)
+                if n_patents is not None:
+                    counts[clean_name] = n_patents
 
+        # only the names missing from the cache are queried
+        missing = clean_names[~clean_names.isin(list(counts))].unique()
+        if len(missing) > 0:
+            sql = ( 'SELECT company_name, COUNT(DISTINCT patents.publication_number) '
+                    + BULK_FROM + 'GROUP BY company_name' )
 
+            query = self.query(sql, self.names_parameters(missing))
+            results = self.fetch(query, timeout, ['clean_name', 'nb_patents'])
 
+            new_counts = dict(zip(results['clean_name'], results['nb_patents']))
+            new_counts = {clean_name: new_counts.get(clean_name, 0) for clean_name in missing}
+            counts.update(new_counts)
 
+            if self.cache is not None:
+                self.cache.set_counts(new_counts, getattr(query, 'total_bytes_processed', 0))
 
+        return {name: counts[clean_name] for name, clean_name in zip(names, clean_names)}
@@ -0,0 +1,119 @@
+import time
+from contextlib import contextmanager
+import pandas as pd
+import scipy.sparse as sp
+from bpideep.feateng import department
+
+
+class Timer():
+    '''
+    records the duration of the named stages of a request
+    '''
+
+    def __init__(self):
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0) + time.perf_counter() - start
+
+    def server_timing(self):
+        '''
+        timings as a Server-Timing header value, in milliseconds
+        '''
+        return ', '.join(f'{name};dur={1000 * duration:.1f}'
+                         for name, duration in self.timings.items())
+
+
+
+def predict_proba_encoded(pipeline, X):
+    '''
+    runs the fitted steps of a pipeline that follow its feature encoder \
+    on already encoded features
+    '''
+    for name, step in pipeline.steps[1:-1]:
+        X = step.transform(X)
+    return pipeline.steps[-1][1].predict_proba(X)
+
+
+
+def feature_columns(features, features_list, columns):
+    '''
+    returns some columns of the main features (a dataframe, or a csr matrix \
+    of the features_list columns) as a dense dataframe
+    '''
+    if isinstance(features, pd.DataFrame):
+        return features[columns]
+    values = features[:, [features_list.index(column) for column in columns]]
+    if sp.issparse(values):
+        values = values.toarray()
+    return pd.DataFrame(values, columns = columns)
+
+
+
+def feature_frame(features, features_list):
+    '''
+    main features as a dataframe, sparse columns for a csr matrix
+    '''
+    if sp.issparse(features):
+        return pd.DataFrame.sparse.from_spmatrix(features, columns = features_list)
+    return features
+
+
+
+def shared_features(X, pipeline):
+    '''
+    computes once the features of the main, time and lab models
+    X: DealRoom rows with the 'nb_patents' found for them
+    pipeline: main pipeline, its feature encoder computes the main features, \
+    the time ratios and the doctor flag are taken from them
+    returns (main features, time features, lab features)
+    '''
+    encoder = pipeline.named_steps['featureencoder']
+    # the feature engineering adds columns to its input
+    features = encoder.transform(X.copy())
+
+    X_time = feature_columns(features, encoder.features_list,
+                             ['funding_employees_ratio', 'stage_age_ratio'])
+    doctor = feature_columns(features, encoder.features_list, ['doctor_yesno'])
+
+    # same values as the LabFeatEncoder: missing patent counts are -1
+    X_lab = pd.DataFrame({'doctor_yesno': doctor['doctor_yesno'].to_numpy(),
+                          'nb_patents': X['nb_patents'].fillna(-1).to_numpy(),
+                          'department': department(X)})
+
+    return features, X_time, X_lab
+
+
+
+def predict_all(X, models, timer = None):
+    '''
+    scores the DealRoom rows of X (with a 'nb_patents' column) with the main, \
+    time and lab models of the models dict, computing their features once
+    returns (main features dataframe, dict of arrays: prediction, \
+    prediction_proba, time_predict and lab_predict)
+    '''
+    timer = timer or Timer()
+    pipeline = models['main']
+
+    with timer.stage('features'):
+        features, X_time, X_lab = shared_features(X, pipeline)
+
+    with timer.stage('main'):
+        result_proba = predict_proba_encoded(pipeline, features)
+    with timer.stage('time'):
+        time_result = models['time'].predict_proba(X_time)
+    with timer.stage('lab'):
+        lab_result = predict_proba_encoded(models['lab'], X_lab)
+
+    results = {'prediction': pipeline.steps[-1][1].classes_[result_proba.argmax(axis = 1)],
+               'prediction_proba': result_proba[:, 1],
+               'time_predict': time_result[:, 1],
+               'lab_predict': lab_result[:, 1]}
+
+    features = feature_frame(features, pipeline.named_steps['featureencoder'].features_list)
+    return features, results
@@ -1,4 +1,5 @@
 from bpideep.getdata import getjson, getfulldata
+from bpideep.rawstore import RawStore
 from bpideep.feateng import zip_code
 from bpideep.encoders import FeatEncoder, LabFeatEncoder
 from sklearn.compose import ColumnTransformer
@@ -26,9 +27,11 @@ class Trainer():
         self.y = y
 
 
-    def set_pipeline(self):
+    def set_pipeline(self, memory = None):
         '''
         create the pipeline and logisticregression model
+        memory: joblib.Memory or directory caching the fitted transformers \
+        (see sklearn Pipeline), e.g. to encode the features once per fold
         '''
 
         patent_transformer = make_pipeline(
@@ -43,7 +46,7 @@ class Trainer():
         pipemodel = Pipeline(steps=[
                             ('featureencoder', LabFeatEncoder()),
                             ('features', features_transformer),
-                            ('model', LogisticRegression())]
+                            ('model', LogisticRegression(solver = 'liblinear'))], memory = memory
                             )
         self.pipeline = pipemodel
 
@@ -65,7 +68,7 @@ if __name__ == "__main__":
 
     # importing data
     company_dict = getjson('deeptech.csv', 'non_deeptech.csv', 'almost_deeptech.csv')
-    X, y = getfulldata(company_dict, 'fields_list.txt')
+    X, y = getfulldata(company_dict, 'fields_list.txt', store = RawStore())
 
     t = Trainer(X, y)
     t.train()
@@ -0,0 +1,194 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+import numpy as np
+import pandas as pd
+import requests
+from bpideep import feateng
+from bpideep.getpatent import Patent
+from bpideep.dealroom import default_client
+from bpideep.getdata import company_search, answer_items, fields_tolist
+from bpideep.patentcache import PatentCache
+
+
+# seconds allowed for each remote call, and for the whole lookup
+PATENT_TIMEOUT = 8
+DEALROOM_TIMEOUT = 8
+DEADLINE = 10
+
+# shared by the requests of a worker: the threads only wait on the network
+executor = ThreadPoolExecutor(max_workers = 16)
+
+# the searches of the batch requests have their own threads, so that \
+# a batch of names never delays the single lookups of /predict
+BATCH_WORKERS = 8
+batch_executor = ThreadPoolExecutor(max_workers = BATCH_WORKERS)
+
+# patent counts shared by the workers through a SQLite file (see cache_dir)
+patent_cache = None
+
+
+def get_patent_cache():
+    '''
+    cache of the patent counts, created on first use
+    '''
+    global patent_cache
+    if patent_cache is None:
+        patent_cache = PatentCache()
+    return patent_cache
+
+
+def local_patent_counts(ids):
+    '''
+    returns the numbers of patents stored in patents.csv for DealRoom ids, \
+    np.nan for the unknown ones
+    '''
+    return pd.Series(list(ids), dtype = object).map(feateng.patents_by_id()).to_numpy(dtype = float)
+
+
+def remaining(start, deadline, timeout = None):
+    '''
+    seconds left to wait for a call of a lookup started at start \
+    (time.monotonic) that must end deadline seconds later, or the call \
+    timeout seconds later if it is sooner
+    '''
+    if timeout is not None:
+        deadline = min(timeout, deadline)
+    return max(0, deadline - (time.monotonic() - start))
+
+
+def patent_counts_or_local(future, timeout, ids, names = None):
+    '''
+    patent counts of a Patent future, waited for at most timeout seconds:
+    - names None: the get_nb_patents count of the company of DealRoom id ids[0]
+    - names: the get_bulk_nb_patents counts of the names, in this order \
+    (ids being their DealRoom ids)
+    if the counts fail or are late, the future is cancelled and the \
+    patents.csv counts of the ids are returned instead
+    '''
+    try:
+        nb_patents = future.result(timeout = timeout)
+        return nb_patents if names is None else [nb_patents[name] for name in names]
+    except Exception as e:
+        # TimeoutError or BigQuery error: fall back to the local counts
+        future.cancel()
+        print(f'patent counts not available ({type(e).__name__}), using patents.csv')
+        counts = local_patent_counts(ids)
+        return counts[0] if names is None else counts
+
+
+
+def company_lookup(name,
+                   patent_timeout = PATENT_TIMEOUT,
+                   dealroom_timeout = DEALROOM_TIMEOUT,
+                   deadline = DEADLINE):
+    '''
+    runs the DealRoom search and the BigQuery patent count of a company name \
+    concurrently, so that the lookup takes the time of the slowest call
+    returns (company, nb_patents)
+    raises TimeoutError if DealRoom does not answer before the deadline
+    if the patent count fails or is late, the patents.csv count is used instead
+    '''
+    start = time.monotonic()
+    company_future = executor.submit(company_search, name, timeout = dealroom_timeout)
+    patent_future = executor.submit(Patent(cache = get_patent_cache()).get_nb_patents, name, timeout = patent_timeout)
+
+    try:
+        company = company_future.result(timeout = remaining(start, deadline, dealroom_timeout))
+    except requests.exceptions.Timeout:
+        raise TimeoutError(f'DealRoom did not answer in time for {name}')
+
+    found = isinstance(company, pd.DataFrame) and not company.empty
+    nb_patents = patent_counts_or_local(patent_future, remaining(start, deadline, patent_timeout),
+                                        company['id'][:1] if found else [np.nan])
+
+    return company, nb_patents
+
+
+
+def companies_lookup(names = None, ids = None,
+                     patent_timeout = PATENT_TIMEOUT,
+                     dealroom_timeout = DEALROOM_TIMEOUT,
+                     deadline = DEADLINE,
+                     client = None,
+                     executor = batch_executor):
+    '''
+    company_lookup for a list of names or of DealRoom ids:
+    - names are searched on DealRoom concurrently (the search takes a single \
+    name) while one BigQuery query counts the patents of all of them
+    - ids are fetched with DealRoom batch calls, then one BigQuery query \
+    counts the patents of their names
+    returns (X, errors):
+    X: DealRoom rows of the companies found, one per distinct query, \
+    with the 'query' (name, or id as a string) and 'nb_patents' columns
+    errors: {query: 'timeout', 'api' or 'not_found'} for the other queries, \
+    a search that raises being an 'api' error of its name only
+    if the patent counts fail or are late, the patents.csv counts are used instead
+    the calls run on executor, the batch one by default; the searches still \
+    queued or running at the deadline are cancelled
+    '''
+    start = time.monotonic()
+    companies = {}
+    errors = {}
+
+    if names is not None:
+        queries = list(dict.fromkeys(names))
+        patent_future = executor.submit(Patent(cache = get_patent_cache()).get_bulk_nb_patents,
+                                        queries, timeout = patent_timeout)
+        futures = {name: executor.submit(company_search, name, timeout = dealroom_timeout)
+                   for name in queries}
+        for name, future in futures.items():
+            try:
+                company = future.result(timeout = remaining(start, deadline, dealroom_timeout))
+            except (TimeoutError, requests.exceptions.Timeout):
+                # past the deadline: the queued searches are not started
+                future.cancel()
+                errors[name] = 'timeout'
+                continue
+            except Exception as e:
+                # e.g. ConnectionError or an invalid answer: only this name fails
+                print(f'DealRoom search of {name} failed ({type(e).__name__})')
+                errors[name] = 'api'
+                continue
+            if isinstance(company, dict):
+                errors[name] = 'api'
+            elif company.empty:
+                errors[name] = 'not_found'
+            else:
+                companies[name] = company.to_dict(orient = 'records')[0]
+        patent_names = list(companies)
+
+    else:
+        queries = list(dict.fromkeys(str(id_) for id_ in ids))
+        client = client or default_client()
+        future = executor.submit(client.get_batches, queries, fields_tolist('fields_list.txt'),
+                                 timeout = dealroom_timeout)
+        try:
+            items = [item for answer in future.result(timeout = remaining(start, deadline, dealroom_timeout))
+                     for item in answer_items(answer)]
+        except (TimeoutError, requests.exceptions.Timeout):
+            future.cancel()
+            return pd.DataFrame(), {id_: 'timeout' for id_ in queries}
+        except ValueError:
+            return pd.DataFrame(), {id_: 'api' for id_ in queries}
+
+        items = {str(item['id']): item for item in items}
+        for id_ in queries:
+            if id_ in items:
+                companies[id_] = items[id_]
+            else:
+                errors[id_] = 'not_found'
+        patent_names = [company['name'] for company in companies.values()]
+        patent_future = executor.submit(Patent(cache = get_patent_cache()).get_bulk_nb_patents,
+                                        patent_names, timeout = patent_timeout)
+
+    if not companies:
+        patent_future.cancel()
+        return pd.DataFrame(), errors
+
+    X = pd.DataFrame(list(companies.values()))
+    X.insert(0, 'query', list(companies))
+
+    X['nb_patents'] = patent_counts_or_local(patent_future, remaining(start, deadline, patent_timeout),
+                                             X['id'], names = patent_names)
+
+    return X, errors
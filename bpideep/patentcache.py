@@ -0,0 +1,89 @@
+import os
+import pandas as pd
+from bpideep.cache import SQLiteCache, cache_dir
+from bpideep.getpatent import Patent, SNAPSHOT
+from bpideep.snapshot import SNAPSHOT_PATH, read_snapshot
+
+
+class PatentCache(SQLiteCache):
+    '''
+    number of patents of a company, keyed by its cleaned assignee name and \
+    the publications snapshot queried
+    the snapshots are frozen, so the counts only expire to bound the staleness \
+    of a snapshot change
+    '''
+
+    def __init__(self, path = None, ttl = 90 * 24 * 3600, max_entries = 200000):
+        path = path or os.path.join(cache_dir(), 'patents.sqlite')
+        super().__init__(path, ttl = ttl, max_entries = max_entries)
+
+
+    def get_nb_patents(self, clean_name, snapshot = SNAPSHOT):
+        return self.get([clean_name, snapshot])
+
+
+    def set_nb_patents(self, clean_name, nb_patents, bytes_processed = 0, snapshot = SNAPSHOT):
+        self.set([clean_name, snapshot], int(nb_patents), bytes_processed)
+
+
+    def set_counts(self, counts, bytes_processed = 0, snapshot = SNAPSHOT):
+        '''
+        stores a {clean_name: nb_patents} dict, bytes_processed being the bytes \
+        of the query that counted all of them
+        '''
+        if len(counts) == 0:
+            return
+        cost = (bytes_processed or 0) // len(counts)
+        self.set_many([([clean_name, snapshot], int(nb_patents), cost)
+                       for clean_name, nb_patents in counts.items()])
+
+
+    def stats(self):
+        '''
+        hits, misses, BigQuery bytes saved by the hits and number of entries
+        '''
+        stats = super().stats()
+        stats['bytes_saved'] = stats.pop('cost_saved')
+        return stats
+
+
+
+def warm_up(cache, names_csv):
+    '''
+    seeds the cache with the counts of data/patents.csv
+    patents.csv is keyed by DealRoom id: names_csv (e.g. the rawdata/data.parquet \
+    or data.csv written by getfulldata) gives the company name of each id
+    returns the number of seeded names
+    '''
+    patents_path = os.path.join(os.path.dirname(__file__), 'data', 'patents.csv')
+    patents_df = pd.read_csv(patents_path)
+    if names_csv.endswith('.parquet'):
+        names_df = read_snapshot(names_csv, columns = ['id', 'name']).dropna()
+    else:
+        names_df = pd.read_csv(names_csv, usecols = ['id', 'name']).dropna()
+
+    df = names_df.merge(patents_df[['id', 'nb_patents']], on = 'id', how = 'inner')
+    df['clean_name'] = Patent().name_clean(df['name'].astype(str))
+    df = df.drop_duplicates(subset = 'clean_name')
+
+    cache.set_counts(dict(zip(df['clean_name'], df['nb_patents'])))
+
+    return len(df)
+
+
+
+if __name__ == "__main__":
+
+    import sys
+
+    # python -m bpideep.patentcache [names_csv]
+    if len(sys.argv) > 1:
+        names_csv = sys.argv[1]
+    else:
+        names_csv = SNAPSHOT_PATH if os.path.exists(SNAPSHOT_PATH) else \
+            os.path.join(os.path.dirname(__file__), 'rawdata', 'data.csv')
+
+    cache = PatentCache()
+    n = warm_up(cache, names_csv)
+    print(f'{n} patent counts seeded in {cache.path}')
+    print(cache.stats())
@@ -0,0 +1,116 @@
+import json
+import os
+from bpideep.dealroom import default_client
+from bpideep.getdata import answer_items
+
+
+STORE_PATH = os.path.join(os.path.dirname(__file__), 'rawdata', 'companies.jsonl')
+
+
+class RawStore():
+    '''
+    local copy of the DealRoom companies: a JSON-lines file with one raw \
+    batch item per line (nested fields kept as JSON), keyed by company id
+    sync only refetches the companies that are new, that DealRoom updated \
+    since they were stored (last_updated_utc) or that miss a requested field
+    '''
+
+    def __init__(self, path = STORE_PATH, client = None, chunk_size = 50, refresh = True):
+        '''
+        refresh: sync the store with DealRoom before reading it, \
+        with False it is only read (the companies that are not stored are left out)
+        '''
+        self.path = path
+        self.client = client
+        self.refresh = refresh
+        self.chunk_size = chunk_size
+
+
+    def load(self):
+        '''
+        returns the dict of the stored items by id (as a string)
+        '''
+        items = {}
+        if not os.path.exists(self.path):
+            return items
+        with open(self.path) as f:
+            for line in f:
+                if line.strip():
+                    item = json.loads(line)
+                    items[str(item['id'])] = item
+        return items
+
+
+    def save(self, items):
+        '''
+        writes the items dict, replacing the file only once it is complete
+        '''
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok = True)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            for item in items.values():
+                f.write(json.dumps(item) + '\n')
+        os.replace(tmp_path, self.path)
+
+
+    def fetch(self, company_id_list, fields_list):
+        '''
+        returns the batch items of the ids by id
+        '''
+        client = self.client or default_client()
+        items = {}
+        for answer in client.get_batches(company_id_list, fields_list, chunk_size = self.chunk_size):
+            for item in answer_items(answer):
+                items[str(item['id'])] = item
+        return items
+
+
+    def stale_ids(self, company_id_list, fields_list, items):
+        '''
+        returns the ids to refetch: the ones not stored or missing a field, \
+        then the ones whose last_updated_utc changed, asked with a light \
+        batch call of the id and last_updated_utc fields only
+        '''
+        missing = [id_ for id_ in company_id_list
+                   if id_ not in items or any(field not in items[id_] for field in fields_list)]
+        missing_set = set(missing)
+        stored = [id_ for id_ in company_id_list if id_ not in missing_set]
+
+        updates = self.fetch(stored, ['id', 'last_updated_utc']) if stored else {}
+        changed = [id_ for id_ in stored
+                   if id_ not in updates
+                   or updates[id_].get('last_updated_utc') != items[id_].get('last_updated_utc')]
+
+        return missing + changed
+
+
+    def sync(self, company_id_list, fields_list):
+        '''
+        refetches the new and stale companies of company_id_list and stores them
+        returns the dict of the stored items by id
+        '''
+        company_id_list = [str(id_) for id_ in dict.fromkeys(company_id_list)]
+        if 'last_updated_utc' not in fields_list:
+            fields_list = fields_list + ['last_updated_utc']
+
+        items = self.load()
+        stale = self.stale_ids(company_id_list, fields_list, items)
+        if stale:
+            items.update(self.fetch(stale, fields_list))
+            self.save(items)
+        print(f'{len(stale)} of {len(company_id_list)} companies fetched from DealRoom')
+
+        return items
+
+
+    def answers(self, company_dict, fields_list):
+        '''
+        returns the stored items of the companies of each label as \
+        (company_type, answer) pairs, the input of getdata.answers_data
+        '''
+        ids = [id_ for id_list in company_dict.values() for id_ in id_list]
+        items = self.sync(ids, fields_list) if self.refresh else self.load()
+
+        return [(company_type, {'items': [dict(items[str(id_)]) for id_ in id_list
+                                          if str(id_) in items]})
+                for company_type, id_list in company_dict.items()]
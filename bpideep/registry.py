@@ -0,0 +1,110 @@
+import os
+import threading
+import time
+import joblib
+
+
+MODEL_FILES = {'main': 'bpideepmodel.joblib',
+               'time': 'bpideepmodel_time.joblib',
+               'lab': 'bpideepmodel_lab.joblib'}
+
+
+class ModelRegistry():
+    '''
+    Keeps the joblib pipelines in memory so that they are unpickled once per \
+    process instead of once per request.
+    The files are checked at most every check_interval seconds and a model \
+    whose file changed on disk is reloaded and swapped in without a restart.
+    '''
+
+    def __init__(self, model_files=None, check_interval=5):
+        self.model_files = dict(model_files or MODEL_FILES)
+        self.check_interval = check_interval
+        # models and versions are swapped together as a single tuple so that \
+        # a request never sees a new model with an old version (or the reverse)
+        self._state = ({}, {})
+        self._lock = threading.Lock()
+        self._last_check = 0
+
+
+    def _version(self, name):
+        '''
+        version of a model file: modification time and size
+        '''
+        stat = os.stat(self.model_files[name])
+        return (stat.st_mtime_ns, stat.st_size)
+
+
+    def _swap(self, name, model, version):
+        models, versions = self._state
+        models = dict(models)
+        versions = dict(versions)
+        models[name] = model
+        versions[name] = version
+        self._state = (models, versions)
+
+
+    def load(self):
+        '''
+        loads every model, to be called at import time so that gunicorn \
+        preload_app shares them across the forked workers
+        '''
+        with self._lock:
+            for name in self.model_files:
+                version = self._version(name)
+                self._swap(name, joblib.load(self.model_files[name]), version)
+            self._last_check = time.monotonic()
+        return self
+
+
+    def refresh(self, force=False):
+        '''
+        reloads the models whose joblib file changed since they were loaded
+        returns the list of the reloaded model names
+        '''
+        now = time.monotonic()
+        if not force and now - self._last_check < self.check_interval:
+            return []
+
+        reloaded = []
+        with self._lock:
+            self._last_check = now
+            for name in self.model_files:
+                try:
+                    version = self._version(name)
+                    if version == self._state[1].get(name):
+                        continue
+                    model = joblib.load(self.model_files[name])
+                except Exception as e:
+                    # file missing or still being written: keep serving \
+                    # the current model and retry at the next check
+                    print(f'{self.model_files[name]} not reloaded: {e}')
+                    continue
+                self._swap(name, model, version)
+                reloaded.append(name)
+        return reloaded
+
+
+    def models(self):
+        '''
+        returns a consistent {name: model} snapshot of the loaded models
+        '''
+        self.refresh()
+        return self._state[0]
+
+
+    def get(self, name):
+        return self.models()[name]
+
+
+    def versions(self):
+        self.refresh()
+        return self._state[1]
+
+
+    def snapshot(self):
+        '''
+        returns ({name: model}, {name: version}) of the same loaded models
+        '''
+        self.refresh()
+        return self._state
@@ -0,0 +1,86 @@
+import os
+import threading
+import time
+from bpideep.cache import MemoryCache, SQLiteCache, cache_dir
+
+
+def normalize_name(name):
+    '''
+    company name as a cache key: lower case, single spaces
+    '''
+    return ' '.join(str(name).lower().split())
+
+
+
+class ResponseCache():
+    '''
+    /predict responses, keyed by the normalized company name and the versions \
+    of the loaded models:
+    - in the memory of the worker process, least recently used entries evicted
+    - optionally shared by the workers through a SQLite file (shared = True)
+    a model hot swap changes the versions: the responses of the previous \
+    models are never served again, and the memory entries are dropped
+    '''
+
+    def __init__(self, ttl = 3600, max_entries = 1024, shared = False, path = None):
+        self.ttl = ttl
+        self.memory = MemoryCache(ttl = ttl, max_entries = max_entries)
+        self.shared = None
+        if shared:
+            path = path or os.path.join(cache_dir(), 'responses.sqlite')
+            self.shared = SQLiteCache(path, ttl = ttl, max_entries = 10 * max_entries)
+        self.versions = None
+        self.lock = threading.Lock()
+
+
+    def key(self, name, versions):
+        self.check_versions(versions)
+        return [normalize_name(name), sorted([model, list(version)]
+                                             for model, version in versions.items())]
+
+
+    def check_versions(self, versions):
+        with self.lock:
+            if versions != self.versions:
+                if self.versions is not None:
+                    self.memory.clear()
+                self.versions = dict(versions)
+
+
+    def get(self, name, versions):
+        '''
+        returns (response, seconds left before it expires), (None, 0) if \
+        there is none for the name and the model versions
+        '''
+        key = self.key(name, versions)
+        entry = self.memory.get(key)
+        if entry is None and self.shared is not None:
+            entry = self.shared.get(key)
+            if entry is not None:
+                self.memory.set(key, entry)
+        if entry is None:
+            return None, 0
+        created, response = entry
+        # a shared entry copied in memory keeps its creation time
+        max_age = int(created + self.ttl - time.time())
+        if max_age <= 0:
+            return None, 0
+        return response, max_age
+
+
+    def set(self, name, versions, response):
+        key = self.key(name, versions)
+        entry = [time.time(), response]
+        self.memory.set(key, entry)
+        if self.shared is not None:
+            self.shared.set(key, entry)
+
+
+    def stats(self):
+        '''
+        hits, misses and entries of the memory cache, and of the shared one
+        '''
+        stats = self.memory.stats()
+        if self.shared is not None:
+            stats['shared'] = self.shared.stats()
+        return stats
@@ -0,0 +1,207 @@
+import itertools
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from bpideep import feateng
+from bpideep.dealroom import default_client
+from bpideep.getdata import answer_items, compact_dtypes, fields_tolist
+from bpideep.inference import predict_all
+from bpideep.registry import ModelRegistry, MODEL_FILES
+
+try:
+    # optional: parquet output
+    import pyarrow
+    import pyarrow.parquet
+    PARQUET = True
+except ImportError:
+    PARQUET = False
+
+
+RESULT_COLUMNS = ['id', 'name', 'prediction', 'prediction_proba', 'time_predict', 'lab_predict']
+
+# schema of the parquet results, fixed up front: a chunk whose names are \
+# all missing must not infer another type than the first chunk
+if PARQUET:
+    RESULT_SCHEMA = pyarrow.schema([('id', pyarrow.int64()),
+                                    ('name', pyarrow.string()),
+                                    ('prediction', pyarrow.int64()),
+                                    ('prediction_proba', pyarrow.float64()),
+                                    ('time_predict', pyarrow.float64()),
+                                    ('lab_predict', pyarrow.float64())])
+
+# models of the process, loaded once by load_models
+models = None
+
+
+def load_models(model_files = None):
+    '''
+    loads the three models in the process (called in each worker)
+    '''
+    global models
+    models = ModelRegistry(model_files).load().models()
+
+
+
+def read_ids(path):
+    '''
+    reads a csv or text file of DealRoom ids, one per line, \
+    with or without an 'id' header
+    '''
+    ids = pd.read_csv(path, header = None, dtype = str, usecols = [0])[0].str.strip().tolist()
+    if ids and ids[0] == 'id':
+        return ids[1:]
+    return ids
+
+
+
+def read_dump(path):
+    '''
+    yields the raw DealRoom items of a JSON-lines dump (see RawStore)
+    '''
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+
+def item_chunks(path, chunk_size = 500, client = None, fields_list = None):
+    '''
+    yields the DealRoom items of the companies of path by lists of chunk_size:
+    - a JSON-lines raw dump (.jsonl) is read as it is
+    - otherwise path is a file of ids, fetched from DealRoom chunk by chunk
+    '''
+    if path.endswith('.jsonl'):
+        items = read_dump(path)
+        while True:
+            chunk = list(itertools.islice(items, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    client = client or default_client()
+    fields_list = fields_list or fields_tolist('fields_list.txt')
+    ids = read_ids(path)
+    for start in range(0, len(ids), chunk_size):
+        answers = client.get_batches(ids[start:start + chunk_size], fields_list)
+        yield [item for answer in answers for item in answer_items(answer)]
+
+
+
+def score_chunk(items):
+    '''
+    scores a list of DealRoom items with the three models of the process
+    the patent counts are the ones of patents.csv (np.nan when unknown)
+    returns the dataframe of the RESULT_COLUMNS
+    '''
+    if models is None:
+        load_models()
+
+    X = compact_dtypes(pd.DataFrame(items))
+    X['nb_patents'] = X['id'].map(feateng.patents_by_id())
+
+    features, results = predict_all(X, models)
+
+    results = pd.DataFrame(results)
+    results.insert(0, 'id', X['id'].to_numpy())
+    results.insert(1, 'name', X['name'].to_numpy())
+    return results[RESULT_COLUMNS]
+
+
+
+def ordered_map(function, iterable, executor = None, window = 4):
+    '''
+    yields function(x) for the x of iterable in order
+    with an executor, at most window calls are in flight: the input \
+    is consumed as the results are written
+    '''
+    if executor is None:
+        yield from map(function, iterable)
+        return
+    futures = deque()
+    for x in iterable:
+        futures.append(executor.submit(function, x))
+        if len(futures) >= window:
+            yield futures.popleft().result()
+    while futures:
+        yield futures.popleft().result()
+
+
+
+class ResultWriter():
+    '''
+    appends the result chunks to a csv or a parquet file (by extension)
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.endswith('.parquet')
+        if self.parquet and not PARQUET:
+            raise ImportError('pyarrow is required to write parquet files')
+        self.writer = None
+        self.rows = 0
+
+    def write(self, results):
+        if self.parquet:
+            table = pyarrow.Table.from_pandas(results, schema = RESULT_SCHEMA,
+                                              preserve_index = False)
+            if self.writer is None:
+                self.writer = pyarrow.parquet.ParquetWriter(self.path, RESULT_SCHEMA)
+            self.writer.write_table(table)
+        else:
+            results.to_csv(self.path, mode = 'a' if self.rows else 'w',
+                           header = not self.rows, index = False)
+        self.rows += len(results)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+
+def score(input_path, output_path, chunk_size = 500, processes = None,
+          model_files = None, client = None):
+    '''
+    scores the companies of input_path (ids file or JSON-lines dump) \
+    with the main, time and lab models, chunk by chunk, and writes \
+    the RESULT_COLUMNS to output_path (.csv or .parquet)
+    processes: number of worker processes, os.cpu_count() by default, \
+    1 scores in the current process (as do inputs of a single chunk)
+    returns (number of rows, seconds)
+    '''
+    start = time.perf_counter()
+    processes = processes or os.cpu_count()
+    chunks = (chunk for chunk in item_chunks(input_path, chunk_size, client = client) if chunk)
+    writer = ResultWriter(output_path)
+
+    # the workers only pay off when there are several chunks
+    first_chunks = list(itertools.islice(chunks, 2))
+    if len(first_chunks) < 2:
+        processes = 1
+    chunks = itertools.chain(first_chunks, chunks)
+
+    try:
+        if processes == 1:
+            load_models(model_files)
+            for results in ordered_map(score_chunk, chunks):
+                writer.write(results)
+        else:
+            with ProcessPoolExecutor(max_workers = processes, initializer = load_models,
+                                     initargs = (model_files,)) as executor:
+                for results in ordered_map(score_chunk, chunks, executor, window = 2 * processes):
+                    writer.write(results)
+    finally:
+        writer.close()
+
+    return writer.rows, time.perf_counter() - start
+
+
+
+def model_files_in(models_dir):
+    '''
+    returns the MODEL_FILES paths in models_dir
+    '''
+    return {name: os.path.join(models_dir, file) for name, file in MODEL_FILES.items()}
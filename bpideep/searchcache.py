@@ -0,0 +1,89 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+import pandas as pd
+from bpideep.cache import SQLiteCache, cache_dir
+from bpideep.responsecache import normalize_name
+
+
+class CompanySearchCache(SQLiteCache):
+    '''
+    DealRoom companies found by a name search, keyed by the match type \
+    ('exact' or 'fuzzy') and the normalized name:
+    - names not found are remembered for negative_ttl seconds only
+    - concurrent searches of the same name in a process wait for the first one
+    - a company found by an exact search also answers the fuzzy searches \
+    of its name
+    API errors are not cached
+    '''
+
+    def __init__(self, path = None, ttl = 24 * 3600, negative_ttl = 3600, max_entries = 100000):
+        path = path or os.path.join(cache_dir(), 'companies.sqlite')
+        super().__init__(path, ttl = ttl, max_entries = max_entries)
+        self.negative_ttl = negative_ttl
+        self.in_flight = {}
+        self.in_flight_lock = threading.Lock()
+
+
+    def get_company(self, match_type, name):
+        '''
+        returns the cached search result: a one row dataframe, an empty one \
+        for a name not found, None if the search is not cached
+        '''
+        entry = self.get([match_type, normalize_name(name)])
+        if entry is None:
+            return None
+        created, record = entry
+        if record is None:
+            if created + self.negative_ttl < time.time():
+                return None
+            return pd.DataFrame()
+        return pd.DataFrame([record])
+
+
+    def set_company(self, match_type, name, company):
+        '''
+        stores a search result, unless it is an API error (dict)
+        '''
+        if isinstance(company, dict):
+            return
+        record = None if company.empty else company.to_dict(orient = 'records')[0]
+        self.set([match_type, normalize_name(name)], [time.time(), record])
+
+
+    def search(self, name, match_type, fetch):
+        '''
+        returns the company of name for match_type, from the cache or \
+        from fetch() (the DealRoom search), fetched once for concurrent calls
+        '''
+        company = self.get_company(match_type, name)
+        if company is None and match_type == 'fuzzy':
+            exact = self.get_company('exact', name)
+            if exact is not None and not exact.empty:
+                company = exact
+        if company is not None:
+            return company
+
+        key = (match_type, normalize_name(name))
+        with self.in_flight_lock:
+            future = self.in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self.in_flight[key] = Future()
+        if not leader:
+            # the callers add columns to the dataframe they get
+            company = future.result()
+            return company.copy() if isinstance(company, pd.DataFrame) else company
+
+        try:
+            company = fetch()
+            self.set_company(match_type, name, company)
+            future.set_result(company)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.in_flight_lock:
+                del self.in_flight[key]
+        return company
@@ -0,0 +1,125 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+
+try:
+    # optional: without pyarrow getfulldata writes the csv snapshot
+    import pyarrow
+    import pyarrow.parquet
+    PARQUET = True
+except ImportError:
+    PARQUET = False
+
+
+SNAPSHOT_PATH = os.path.join(os.path.dirname(__file__), 'rawdata', 'data.parquet')
+
+# schema metadata listing the columns stored as JSON strings
+JSON_COLUMNS_KEY = b'bpideep.json_columns'
+
+
+def writable(arrow_type):
+    '''
+    False for the types parquet cannot write: structs without fields \
+    (empty dicts), at any depth
+    '''
+    if pyarrow.types.is_struct(arrow_type):
+        return arrow_type.num_fields > 0 and all(writable(field.type) for field in arrow_type)
+    if pyarrow.types.is_list(arrow_type) or pyarrow.types.is_large_list(arrow_type):
+        return writable(arrow_type.value_type)
+    return True
+
+
+
+def is_missing(value):
+    return value is None or (isinstance(value, float) and np.isnan(value))
+
+
+
+def arrow_column(values):
+    '''
+    returns (arrow array of the values, False): the nested lists and dicts \
+    of the DealRoom items become list and struct types
+    returns (array of JSON strings, True) for the values arrow cannot type \
+    as one column (e.g. numbers and strings mixed, empty dicts)
+    '''
+    try:
+        array = pyarrow.array(values, from_pandas = True)
+        if writable(array.type):
+            return array, False
+    except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError,
+            pyarrow.ArrowNotImplementedError, OverflowError):
+        pass
+    strings = [None if is_missing(value) else json.dumps(value, default = str)
+               for value in values]
+    return pyarrow.array(strings, type = pyarrow.string()), True
+
+
+
+def write_snapshot(data, path = SNAPSHOT_PATH):
+    '''
+    writes the data dataframe (e.g. the DealRoom companies of getfulldata) \
+    as a parquet file, nested fields included, replacing the file only \
+    once it is complete
+    returns the columns that had to be stored as JSON strings
+    '''
+    if not PARQUET:
+        raise ImportError('pyarrow is required to write the parquet snapshot')
+
+    arrays, json_columns = [], []
+    for column in data.columns:
+        array, as_json = arrow_column(data[column])
+        arrays.append(array)
+        if as_json:
+            json_columns.append(column)
+
+    table = pyarrow.Table.from_arrays(arrays, names = [str(column) for column in data.columns])
+    table = table.replace_schema_metadata({JSON_COLUMNS_KEY: json.dumps(json_columns)})
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok = True)
+    tmp_path = f'{path}.tmp'
+    pyarrow.parquet.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+    return json_columns
+
+
+
+def read_snapshot(path = SNAPSHOT_PATH, columns = None):
+    '''
+    reads a snapshot written by write_snapshot, memory-mapped: only the \
+    requested columns (all of them by default, the ones the file lacks \
+    being left out) are read and decoded
+    the nested fields come back as python lists and dicts, as in the batch answers
+    '''
+    if not PARQUET:
+        raise ImportError('pyarrow is required to read the parquet snapshot')
+
+    if columns is not None:
+        names = set(pyarrow.parquet.read_schema(path, memory_map = True).names)
+        columns = [column for column in columns if column in names]
+    table = pyarrow.parquet.read_table(path, columns = columns, memory_map = True)
+    metadata = table.schema.metadata or {}
+    json_columns = set(json.loads(metadata.get(JSON_COLUMNS_KEY, b'[]')))
+
+    data = {}
+    for name, column in zip(table.column_names, table.columns):
+        arrow_type = column.type
+        if name in json_columns:
+            data[name] = [None if value is None else json.loads(value)
+                          for value in column.to_pylist()]
+        elif pyarrow.types.is_nested(arrow_type):
+            data[name] = column.to_pylist()
+        else:
+            data[name] = column.to_pandas()
+    return pd.DataFrame(data, columns = table.column_names)
+
+
+
+def snapshot_data(path = SNAPSHOT_PATH, fields_list = None):
+    '''
+    returns the (X, y) of getfulldata from a snapshot, reading only \
+    the fields_list columns (e.g. the feateng RAW_FIELDS) and the target
+    '''
+    columns = None if fields_list is None else list(fields_list) + ['target']
+    data = read_snapshot(path, columns = columns)
+    return data.drop(columns = 'target'), data['target']
@@ -1,4 +1,5 @@
 from bpideep.getdata import getjson, getfulldata
+from bpideep.rawstore import RawStore
 from bpideep.feateng import funding_amounts_employees, get_stage_age_ratio
 from bpideep.encoders import FeatEncoder
 from sklearn.compose import ColumnTransformer
@@ -11,7 +12,6 @@ from sklearn.linear_model import LogisticRegression
 import numpy as np
 import pandas as pd
 import joblib
-import statsmodels.formula.api as smf
 
 
 
@@ -25,9 +25,11 @@ class Trainer():
         self.y = y
 
 
-    def set_pipeline(self):
+    def set_pipeline(self, memory = None):
         '''
         create the pipeline and logisticregression model
+        memory: joblib.Memory or directory caching the fitted ratio_transformer \
+        (imputer and scaler, see sklearn Pipeline) across fits on the same data
         '''
 
         ratio_transformer = make_pipeline(
@@ -37,7 +39,7 @@ class Trainer():
 
         pipemodel = Pipeline(steps=[
                             ('ratio_transformer', ratio_transformer),
-                            ('model', LogisticRegression())]
+                            ('model', LogisticRegression(solver = 'liblinear'))], memory = memory
                                          )
         self.pipeline = pipemodel
 
@@ -60,7 +62,7 @@ if __name__ == "__main__":
 
     # importing data
     company_dict = getjson('deeptech.csv', 'non_deeptech.csv', 'almost_deeptech.csv')
-    X, y = getfulldata(company_dict, 'fields_list.txt')
+    X, y = getfulldata(company_dict, 'fields_list.txt', store = RawStore())
     X['funding_employees_ratio'] = funding_amounts_employees(X)
     X['stage_age_ratio'] = get_stage_age_ratio(X)
     X = X[['funding_employees_ratio', 'stage_age_ratio']]
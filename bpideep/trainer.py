@@ -1,5 +1,7 @@
 from bpideep.getdata import getjson, getfulldata
+from bpideep.rawstore import RawStore
 from bpideep.encoders import FeatEncoder
+from bpideep.feateng import SIMPLE_FEATURES
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline, make_pipeline
 from sklearn.linear_model import LogisticRegression
@@ -9,6 +11,7 @@ from sklearn.preprocessing import StandardScaler, RobustScaler
 from sklearn.metrics import classification_report
 import numpy as np
 import joblib
+from functools import partial
 # import pandas as pd
 
 
@@ -23,28 +26,46 @@ class Trainer():
         self.y = y
 
 
-    def set_pipeline(self):
+    def set_pipeline(self, memory = None, sparse = False, kept_tags = None):
         '''
         create the pipeline and logisticregression model
+        memory: joblib.Memory or directory caching the fitted transformers \
+        (see sklearn Pipeline), e.g. to encode the features once per fold
+        sparse: the encoder emits a csr matrix and the model is trained on it \
+        without densifying (columns selected by position, scaled without centering)
+        kept_tags: tag columns of the encoder, KEPT_TAGS by default \
+        (e.g. feateng.all_tags of the training data, with sparse)
         '''
 
+        if sparse:
+            # a csr matrix has no column names, and centering would fill the zeros
+            ratio_columns = [SIMPLE_FEATURES.index('funding_employees_ratio'),
+                             SIMPLE_FEATURES.index('stage_age_ratio')]
+            patent_columns = [SIMPLE_FEATURES.index('nb_patents')]
+            scaler = partial(RobustScaler, with_centering = False)
+        else:
+            ratio_columns = ['funding_employees_ratio', 'stage_age_ratio']
+            patent_columns = ['nb_patents']
+            scaler = RobustScaler
+
         ratio_transformer = make_pipeline(
                                 SimpleImputer(missing_values=np.nan, strategy='mean'),
-                                RobustScaler())
+                                scaler())
 
         patent_transformer = make_pipeline(
                                 SimpleImputer(missing_values=np.nan, strategy='constant', fill_value = 0),
-                                RobustScaler())
+                                scaler())
 
         features_transformer = ColumnTransformer(
-            [("ratio_preproc", ratio_transformer, ['funding_employees_ratio', 'stage_age_ratio']),
-             ("patents_preproc", patent_transformer, ['nb_patents'])], remainder = 'passthrough')
+            [("ratio_preproc", ratio_transformer, ratio_columns),
+             ("patents_preproc", patent_transformer, patent_columns)], remainder = 'passthrough',
+            sparse_threshold = 1.0 if sparse else 0.3)
 
 
         pipemodel = Pipeline(steps=[
-                            ('featureencoder', FeatEncoder()),
+                            ('featureencoder', FeatEncoder(sparse = sparse, kept_tags = kept_tags)),
                             ('features', features_transformer),
-                            ('model', LogisticRegression(penalty = 'l1', C = 1.52))]
+                            ('model', LogisticRegression(penalty = 'l1', C = 1.52, solver = 'liblinear'))], memory = memory
                             )
         self.pipeline = pipemodel
 
@@ -67,7 +88,7 @@ if __name__ == "__main__":
 
     # importing data
     company_dict = getjson('deeptech.csv', 'non_deeptech.csv', 'almost_deeptech.csv')
-    X, y = getfulldata(company_dict, 'fields_list.txt')
+    X, y = getfulldata(company_dict, 'fields_list.txt', store = RawStore())
 
     t = Trainer(X, y)
     t.train()
@@ -0,0 +1,172 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+import joblib
+import sklearn
+from joblib import Parallel, delayed
+from sklearn.pipeline import Pipeline
+from bpideep import trainer, labtrainer, timetrainer
+from bpideep.encoders import FeatEncoder, LabFeatEncoder
+from bpideep.feateng import all_tags, RAW_FIELDS, SIMPLE_FEATURES
+from bpideep.getdata import getjson, getfulldata
+from bpideep.inference import Timer, feature_columns
+from bpideep.rawstore import RawStore
+from bpideep.snapshot import SNAPSHOT_PATH, snapshot_data
+from bpideep.registry import MODEL_FILES
+
+
+MANIFEST_FILE = 'bpideepmodel_manifest.json'
+
+
+def data_hash(X, y):
+    '''
+    sha256 of the RAW_FIELDS of the training rows and of the targets, \
+    nested fields included: the same for the rows of getfulldata and of \
+    its snapshot (whose nested dicts may come back with their keys reordered)
+    '''
+    data = X.reindex(columns = [field for field in RAW_FIELDS if field in X.columns])
+    data = data.assign(target = y.to_numpy())
+    records = json.dumps(data.to_dict(orient = 'records'), sort_keys = True, default = str)
+    return hashlib.sha256(records.encode()).hexdigest()
+
+
+
+def shared_table(X, timer = None, sparse = False, kept_tags = None):
+    '''
+    fits the feature encoders of the main and lab models and computes \
+    the features of the three models, the tags being encoded once
+    sparse, kept_tags: the main features are a csr matrix, of the kept_tags \
+    columns (see FeatEncoder)
+    returns (fitted encoders dict, features dict) for 'main', 'lab' and 'time'
+    '''
+    timer = timer or Timer()
+    encoders = {'main': FeatEncoder(sparse = sparse, kept_tags = kept_tags),
+                'lab': LabFeatEncoder()}
+
+    with timer.stage('features'):
+        # the feature engineering adds columns to its input
+        features = encoders['main'].fit_transform(X.copy())
+        X_lab = encoders['lab'].fit(X).transform(X.copy())
+
+    # the time model is fitted on the ratios of the main features
+    X_time = feature_columns(features, encoders['main'].features_list,
+                             ['funding_employees_ratio', 'stage_age_ratio'])
+
+    return encoders, {'main': features, 'lab': X_lab, 'time': X_time}
+
+
+
+def fit_timed(name, pipeline, X, y):
+    '''
+    fits pipeline, returns (name, fitted pipeline, fit duration in seconds)
+    '''
+    start = time.perf_counter()
+    pipeline.fit(X, y)
+    return name, pipeline, time.perf_counter() - start
+
+
+
+def model_pipelines(sparse = False, kept_tags = None):
+    '''
+    returns the unfitted pipelines of the trainers by model name
+    sparse, kept_tags: options of the main pipeline (see Trainer.set_pipeline)
+    '''
+    pipelines = {}
+    for name, module in [('main', trainer), ('lab', labtrainer), ('time', timetrainer)]:
+        t = module.Trainer(None, None)
+        if name == 'main':
+            t.set_pipeline(sparse = sparse, kept_tags = kept_tags)
+        else:
+            t.set_pipeline()
+        pipelines[name] = t.pipeline
+    return pipelines
+
+
+
+def train_all(X, y, output_dir = '.', n_jobs = 3, timer = None, sparse = False,
+              kept_tags = None):
+    '''
+    fits the main, lab and time models on the DealRoom rows X and targets y:
+    - the features are computed once (see shared_table)
+    - the steps following the encoders are fitted in n_jobs parallel processes
+    - sparse: the main model is trained on a csr matrix of its features
+    - kept_tags: tag columns of the main model, KEPT_TAGS by default
+    writes the three joblib pipelines and a manifest (data hash, timings) \
+    in output_dir, returns the fitted pipelines dict
+    '''
+    timer = timer or Timer()
+    start = time.perf_counter()
+
+    encoders, tables = shared_table(X, timer, sparse = sparse, kept_tags = kept_tags)
+    pipelines = model_pipelines(sparse = sparse, kept_tags = kept_tags)
+
+    # the encoders are fitted: only the steps after them are left to fit
+    to_fit = {name: Pipeline(pipeline.steps[1:]) if name in encoders else pipeline
+              for name, pipeline in pipelines.items()}
+
+    with timer.stage('fit'):
+        fitted = Parallel(n_jobs = n_jobs)(delayed(fit_timed)(name, pipeline, tables[name], y)
+                                          for name, pipeline in to_fit.items())
+
+    models = {}
+    for name, pipeline, duration in fitted:
+        if name in encoders:
+            encoder_name = pipelines[name].steps[0][0]
+            pipeline = Pipeline([(encoder_name, encoders[name])] + pipeline.steps)
+        models[name] = pipeline
+        timer.timings[f'fit_{name}'] = duration
+
+    with timer.stage('save'):
+        os.makedirs(output_dir, exist_ok = True)
+        for name, pipeline in models.items():
+            joblib.dump(pipeline, os.path.join(output_dir, MODEL_FILES[name]))
+
+    manifest = {'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'data_hash': data_hash(X, y),
+                'nb_companies': len(X),
+                'nb_deeptech': int((y == 1).sum()),
+                'sklearn_version': sklearn.__version__,
+                'sparse': sparse,
+                'nb_tags': len(encoders['main'].features_list) - len(SIMPLE_FEATURES),
+                'models': {name: MODEL_FILES[name] for name in models},
+                'timings': {name: round(duration, 3) for name, duration in timer.timings.items()},
+                'total': round(time.perf_counter() - start, 3)}
+    with open(os.path.join(output_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent = 2)
+    print(f'{", ".join(MODEL_FILES[name] for name in models)} and {MANIFEST_FILE} '
+          f'saved in {output_dir}')
+
+    return models
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'trains the main, lab and time models')
+    parser.add_argument('--output-dir', default = '.')
+    parser.add_argument('--n-jobs', type = int, default = 3)
+    parser.add_argument('--no-refresh', action = 'store_true',
+                        help = 'train on the local raw store without asking DealRoom')
+    parser.add_argument('--sparse', action = 'store_true',
+                        help = 'train the main model on a sparse matrix of its features')
+    parser.add_argument('--all-tags', action = 'store_true',
+                        help = 'every tag of the training data as a main feature '
+                               'instead of the kept tags (best with --sparse)')
+    parser.add_argument('--snapshot', nargs = '?', const = SNAPSHOT_PATH, default = None,
+                        help = 'train on the parquet snapshot of the last getfulldata '
+                               '(rawdata/data.parquet by default)')
+    args = parser.parse_args()
+
+    timer = Timer()
+    with timer.stage('data'):
+        if args.snapshot:
+            X, y = snapshot_data(args.snapshot, RAW_FIELDS)
+        else:
+            company_dict = getjson('deeptech.csv', 'non_deeptech.csv', 'almost_deeptech.csv')
+            X, y = getfulldata(company_dict, 'fields_list.txt',
+                               store = RawStore(refresh = not args.no_refresh))
+
+    kept_tags = all_tags(X.copy()) if args.all_tags else None
+    train_all(X, y, output_dir = args.output_dir, n_jobs = args.n_jobs, timer = timer,
+              sparse = args.sparse, kept_tags = kept_tags)
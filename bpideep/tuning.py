@@ -0,0 +1,131 @@
+import argparse
+import shutil
+import tempfile
+import pandas as pd
+from scipy.stats import loguniform
+from sklearn.metrics import classification_report
+from sklearn.model_selection import StratifiedKFold, GridSearchCV, RandomizedSearchCV, \
+    cross_val_predict
+from bpideep import trainer, labtrainer, timetrainer
+from bpideep.feateng import funding_amounts_employees, get_stage_age_ratio, RAW_FIELDS
+from bpideep.getdata import getjson, getfulldata
+from bpideep.rawstore import RawStore
+from bpideep.snapshot import SNAPSHOT_PATH, snapshot_data
+
+
+TRAINERS = {'main': trainer, 'lab': labtrainer, 'time': timetrainer}
+
+# grids of the model step, the encoders having no hyper-parameter
+PARAM_GRIDS = {'main': {'model__penalty': ['l1', 'l2'],
+                        'model__C': [0.1, 0.3, 1, 1.52, 3, 10]},
+               'lab': {'model__penalty': ['l1', 'l2'],
+                       'model__C': [0.1, 0.3, 1, 3, 10]},
+               'time': {'model__C': [0.1, 0.3, 1, 3, 10]}}
+
+# distributions of the randomized search
+PARAM_DISTRIBUTIONS = {name: dict(grid, model__C = loguniform(0.01, 100))
+                       for name, grid in PARAM_GRIDS.items()}
+
+
+def model_data(name, X):
+    '''
+    returns the input of the pipeline of the model name for the DealRoom rows X \
+    (the time model takes the two ratios, as in timetrainer)
+    '''
+    if name != 'time':
+        return X
+    # the feature engineering adds columns to its input
+    X = X.copy()
+    return pd.DataFrame({'funding_employees_ratio': funding_amounts_employees(X),
+                         'stage_age_ratio': get_stage_age_ratio(X)})
+
+
+
+def make_pipeline(name, memory = None):
+    '''
+    returns the unfitted pipeline of the Trainer of the model name
+    '''
+    t = TRAINERS[name].Trainer(None, None)
+    t.set_pipeline(memory = memory)
+    return t.pipeline
+
+
+
+def evaluate(name, X, y, cv = 5, n_jobs = -1, memory = None):
+    '''
+    stratified cross validation of the pipeline of the model name, \
+    the folds being fitted in n_jobs processes
+    returns the classification report of the out of fold predictions
+    '''
+    folds = StratifiedKFold(n_splits = cv, shuffle = True, random_state = 0)
+    y_pred = cross_val_predict(make_pipeline(name, memory), model_data(name, X), y,
+                               cv = folds, n_jobs = n_jobs)
+    return classification_report(y, y_pred)
+
+
+
+def search(name, X, y, param_grid = None, n_iter = None, cv = 5, n_jobs = -1,
+           memory = None, scoring = 'roc_auc'):
+    '''
+    stratified grid search over the pipeline of the model name, \
+    or randomized search of n_iter candidates when n_iter is given
+    the (fold, candidate) fits run in n_jobs processes; with memory the \
+    transformers are fitted once per fold and reused by every candidate
+    returns the fitted search, refitted on all the data with the best parameters
+    '''
+    folds = StratifiedKFold(n_splits = cv, shuffle = True, random_state = 0)
+    pipeline = make_pipeline(name, memory)
+
+    if n_iter is None:
+        searcher = GridSearchCV(pipeline, param_grid or PARAM_GRIDS[name],
+                                scoring = scoring, cv = folds, n_jobs = n_jobs)
+    else:
+        searcher = RandomizedSearchCV(pipeline, param_grid or PARAM_DISTRIBUTIONS[name],
+                                      n_iter = n_iter, scoring = scoring, cv = folds,
+                                      n_jobs = n_jobs, random_state = 0)
+
+    return searcher.fit(model_data(name, X), y)
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'cross validates and tunes a model')
+    parser.add_argument('model', choices = list(TRAINERS))
+    parser.add_argument('--cv', type = int, default = 5)
+    parser.add_argument('--n-jobs', type = int, default = -1)
+    parser.add_argument('--n-iter', type = int, default = None,
+                        help = 'randomized search of n-iter candidates instead of the grid')
+    parser.add_argument('--evaluate-only', action = 'store_true',
+                        help = 'cross validation of the current parameters only')
+    parser.add_argument('--cache-dir', default = None,
+                        help = 'directory of the fitted transformers, kept between runs')
+    parser.add_argument('--no-refresh', action = 'store_true',
+                        help = 'use the local raw store without asking DealRoom')
+    parser.add_argument('--snapshot', nargs = '?', const = SNAPSHOT_PATH, default = None,
+                        help = 'use the parquet snapshot of the last getfulldata '
+                               '(rawdata/data.parquet by default)')
+    args = parser.parse_args()
+
+    if args.snapshot:
+        X, y = snapshot_data(args.snapshot, RAW_FIELDS)
+    else:
+        company_dict = getjson('deeptech.csv', 'non_deeptech.csv', 'almost_deeptech.csv')
+        X, y = getfulldata(company_dict, 'fields_list.txt',
+                           store = RawStore(refresh = not args.no_refresh))
+    y = y.astype(int)
+
+    # the evaluation and the search share the folds, hence the cached encodings
+    cache_dir = args.cache_dir or tempfile.mkdtemp(prefix = 'bpideep-')
+    try:
+        print(evaluate(args.model, X, y, cv = args.cv, n_jobs = args.n_jobs, memory = cache_dir))
+
+        if not args.evaluate_only:
+            result = search(args.model, X, y, n_iter = args.n_iter, cv = args.cv,
+                            n_jobs = args.n_jobs, memory = cache_dir)
+            results = pd.DataFrame(result.cv_results_)
+            columns = ['params', 'mean_test_score', 'std_test_score', 'rank_test_score']
+            print(results[columns].sort_values('rank_test_score').head(10).to_string())
+            print(f'best {result.scoring}: {result.best_score_:.4f} with {result.best_params_}')
+    finally:
+        if args.cache_dir is None:
+            shutil.rmtree(cache_dir, ignore_errors = True)
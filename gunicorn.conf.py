@@ -0,0 +1,13 @@
+# gunicorn settings (Procfile: gunicorn --config gunicorn.conf.py app:app)
+import gc
+
+# import app.py, and so load the models, once in the master process: \
+# the forked workers share the model pages copy-on-write
+preload_app = True
+
+
+def when_ready(server):
+    # moves the preloaded objects out of the gc generations so that \
+    # collections in the workers do not write to (and copy) their pages
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
@@ -13,5 +13,5 @@ setup(name='bpideep',
       test_suite = 'tests',
       # include_package_data: to install data from MANIFEST.in
       include_package_data=True,
-      scripts=['scripts/bpideep-run'],
+      scripts=['scripts/bpideep-run', 'scripts/bpideep-score'],
       zip_safe=False)
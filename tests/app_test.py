@@ -0,0 +1,215 @@
+# -*- coding: UTF-8 -*-
+
+# Import from standard library
+import importlib
+import os
+# Import from third party
+import numpy as np
+import pandas as pd
+import pytest
+import requests
+# Import from our lib
+from bpideep.responsecache import ResponseCache
+from bpideep.training import train_all
+from tests.fixtures import make_companies, BulkPatent
+
+
+class StubRegistry():
+    """ models and versions of the registry, bumped by the tests
+    """
+
+    def __init__(self, models):
+        self.models = models
+        self.versions = {name: (1, 0) for name in models}
+
+    def snapshot(self):
+        return self.models, dict(self.versions)
+
+    def get(self, name):
+        return self.models[name]
+
+
+@pytest.fixture(scope='module')
+def app_module(tmp_path_factory):
+    # app.py loads the models of the working directory at import
+    models_dir = tmp_path_factory.mktemp('models')
+    X = make_companies(300)
+    train_all(X, pd.Series(np.arange(300) % 2), output_dir=str(models_dir), n_jobs=1)
+    cwd = os.getcwd()
+    os.chdir(str(models_dir))
+    try:
+        app = importlib.import_module('app')
+    finally:
+        os.chdir(cwd)
+    return app
+
+
+@pytest.fixture
+def app(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'registry', StubRegistry(app_module.registry.models()))
+    monkeypatch.setattr(app_module, 'response_cache', ResponseCache(ttl=60))
+    return app_module
+
+
+def dealroom_rows(queries):
+    """ DealRoom rows of the companies found for queries, as companies_lookup
+    """
+    X = make_companies(len(queries), seed=1)
+    X.insert(0, 'query', list(queries))
+    X['images'] = [{'100x100': f'{query}.png'} for query in queries]
+    X['about'] = [f'about {query}' for query in queries]
+    X['nb_patents'] = np.arange(len(queries)) % 3
+    return X
+
+
+class StubLookup():
+    """ companies_lookup finding every query but the unknown ones,
+    recording the queries asked
+    """
+
+    def __init__(self, unknown=()):
+        self.unknown = set(unknown)
+        self.calls = []
+
+    def __call__(self, names=None, ids=None):
+        queries = names if names is not None else [str(id_) for id_ in ids]
+        queries = list(dict.fromkeys(queries))
+        self.calls.append(queries)
+        found = [query for query in queries if query not in self.unknown]
+        errors = {query: 'not_found' for query in queries if query in self.unknown}
+        return (dealroom_rows(found) if found else pd.DataFrame()), errors
+
+
+def test_predict_batch_order_duplicates_and_not_found(app, monkeypatch):
+    lookup = StubLookup(unknown=['nowhere'])
+    monkeypatch.setattr(app, 'companies_lookup', lookup)
+    client = app.app.test_client()
+
+    response = client.post('/predict/batch', json={'names': ['b', 'nowhere', 'a', 'b']})
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [result['query'] for result in results] == ['b', 'nowhere', 'a', 'b']
+    # a repeated name is looked up and scored once
+    assert lookup.calls == [['b', 'nowhere', 'a']]
+    assert results[0] == results[3]
+    assert results[1]['predictions'] == app.ERROR_MESSAGES['not_found']
+    assert results[2]['image'] == 'a.png'
+    assert 0 <= float(results[2]['prediction_proba']) <= 1
+
+    # the scored names are then served from the response cache
+    response = client.post('/predict/batch', json={'names': ['a', 'c']})
+    assert [result['query'] for result in response.get_json()['results']] == ['a', 'c']
+    assert lookup.calls[-1] == ['c']
+
+
+def test_predict_batch_isolates_bad_companies(app, monkeypatch):
+    def company_search(name, timeout=None):
+        if name == 'down':
+            raise requests.exceptions.ConnectionError('connection reset')
+        X = dealroom_rows([name]).drop(columns=['query', 'nb_patents'])
+        if name == 'no image':
+            X = X.drop(columns='images')
+        return X
+
+    # the real companies_lookup, on stubbed DealRoom searches and patent counts
+    monkeypatch.setattr('bpideep.lookup.company_search', company_search)
+    monkeypatch.setattr('bpideep.lookup.Patent', BulkPatent)
+
+    response = app.app.test_client().post('/predict/batch',
+                                          json={'names': ['a', 'down', 'no image']})
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [result['query'] for result in results] == ['a', 'down', 'no image']
+    assert results[0]['image'] == 'a.png'
+    assert results[1]['predictions'] == app.ERROR_MESSAGES['api']
+    assert results[2]['image'] is None
+    assert 'prediction' in results[2]
+
+
+def test_predict_batch_by_ids(app, monkeypatch):
+    lookup = StubLookup(unknown=['404'])
+    monkeypatch.setattr(app, 'companies_lookup', lookup)
+    response = app.app.test_client().post('/predict/batch', json={'ids': [12, 404, 7]})
+    results = response.get_json()['results']
+    assert [result['query'] for result in results] == ['12', '404', '7']
+    assert results[1]['predictions'] == app.ERROR_MESSAGES['not_found']
+    assert 'prediction' in results[2]
+
+
+@pytest.mark.parametrize('body', [
+    {},
+    {'names': 'a'},
+    {'names': ['a'], 'ids': [1]},
+    {'names': [['a']]},
+    {'names': ['a', None]},
+    {'ids': ['12']},
+    {'ids': [1.5]},
+    {'ids': [True]},
+])
+def test_predict_batch_bad_requests(app, monkeypatch, body):
+    lookup = StubLookup()
+    monkeypatch.setattr(app, 'companies_lookup', lookup)
+    response = app.app.test_client().post('/predict/batch', json=body)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+    assert lookup.calls == []
+
+
+def test_predict_batch_max_batch(app, monkeypatch):
+    monkeypatch.setattr(app, 'companies_lookup', StubLookup())
+    client = app.app.test_client()
+    names = [f'company {i}' for i in range(app.MAX_BATCH + 1)]
+    assert client.post('/predict/batch', json={'names': names}).status_code == 400
+    response = client.post('/predict/batch', json={'names': names[:app.MAX_BATCH]})
+    assert response.status_code == 200
+    assert len(response.get_json()['results']) == app.MAX_BATCH
+
+
+class StubCompanyLookup():
+    """ company_lookup of the /predict route, counting the calls
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, name):
+        self.calls.append(name)
+        X = dealroom_rows([name]).drop(columns=['query', 'nb_patents'])
+        return X, 2
+
+
+def test_predict_response_cache(app, monkeypatch):
+    lookup = StubCompanyLookup()
+    monkeypatch.setattr(app, 'company_lookup', lookup)
+    client = app.app.test_client()
+
+    first = client.get('/predict', query_string={'name': 'Acme'})
+    assert first.status_code == 200
+    assert first.headers['X-Cache'] == 'MISS'
+    assert first.headers['Cache-Control'] == f'public, max-age={app.RESPONSE_TTL}'
+
+    # same company, same models: served from the cache without a lookup
+    repeat = client.get('/predict', query_string={'name': 'acme '})
+    assert repeat.headers['X-Cache'] == 'HIT'
+    max_age = int(repeat.headers['Cache-Control'].split('max-age=')[1])
+    assert repeat.headers['Cache-Control'].startswith('public, ')
+    assert 0 < max_age <= 60
+    assert repeat.get_json() == first.get_json()
+    assert lookup.calls == ['Acme']
+
+    # a new version of a model invalidates the cached responses
+    app.registry.versions['main'] = (2, 0)
+    bumped = client.get('/predict', query_string={'name': 'Acme'})
+    assert bumped.headers['X-Cache'] == 'MISS'
+    assert lookup.calls == ['Acme', 'Acme']
+    assert client.get('/predict', query_string={'name': 'Acme'}).headers['X-Cache'] == 'HIT'
+
+
+def test_predict_errors_are_not_cached(app, monkeypatch):
+    monkeypatch.setattr(app, 'company_lookup', lambda name: (pd.DataFrame(), None))
+    client = app.app.test_client()
+    for _ in range(2):
+        response = client.get('/predict', query_string={'name': 'nowhere'})
+        assert response.get_json() == {'predictions': app.ERROR_MESSAGES['not_found']}
+        assert response.headers['X-Cache'] == 'MISS'
+        assert response.headers['Cache-Control'] == 'no-store'
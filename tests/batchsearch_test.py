@@ -0,0 +1,90 @@
+# -*- coding: UTF-8 -*-
+
+# Import from standard library
+import time
+import numpy as np
+import pandas as pd
+# Import from our lib
+from bpideep import batchsearch, feateng
+from tests.fixtures import BulkPatent
+
+
+class ShuffledClient():
+    """ batch call answering the known ids in reverse order
+    """
+
+    def __init__(self, known_ids):
+        self.known_ids = known_ids
+
+    def get_batch(self, company_id_list, fields_list):
+        return {'items': [{'id': int(id_), 'name': f'dealroom {id_}'}
+                          for id_ in reversed(company_id_list) if int(id_) in self.known_ids]}
+
+
+class FailingPatent(BulkPatent):
+    def get_bulk_nb_patents(self, names, timeout=None):
+        raise RuntimeError('BigQuery is down')
+
+
+class StalledPatent(BulkPatent):
+    def get_bulk_nb_patents(self, names, timeout=None):
+        time.sleep(1)
+        return {name: 1000 for name in names}
+
+
+class HalfModel():
+    """ predict_proba of 0.75 for the even ids
+    """
+    steps = [('model', type('Classes', (), {'classes_': np.array([0, 1])})())]
+
+    def predict_proba(self, X):
+        even = (X['id'] % 2 == 0).to_numpy()
+        return np.column_stack([np.where(even, 0.25, 0.75), np.where(even, 0.75, 0.25)])
+
+
+def companies(ids):
+    return pd.DataFrame({'id': ids, 'name': [f'name {id_}' for id_ in ids]})
+
+
+def test_fetch_companies_in_order(monkeypatch):
+    monkeypatch.setattr(batchsearch, 'Patent', BulkPatent)
+    # 404 has no match on DealRoom
+    X = batchsearch.fetch_companies(companies([12, 404, 7, 30]),
+                                    client = ShuffledClient({12, 7, 30}))
+    assert X['id'].tolist() == [12, 7, 30]
+    assert X['name'].tolist() == ['dealroom 12', 'dealroom 7', 'dealroom 30']
+    # patents counted for the names of the request
+    assert X['nb_patents'].tolist() == [len('name 12'), len('name 7'), len('name 30')]
+
+
+def test_fetch_companies_without_match(monkeypatch):
+    monkeypatch.setattr(batchsearch, 'Patent', BulkPatent)
+    X = batchsearch.fetch_companies(companies([404]), client = ShuffledClient(set()))
+    assert X.empty
+
+
+def test_fetch_companies_falls_back_to_local_patents(monkeypatch):
+    patents = feateng.load_patents()
+    ids = patents['id'][:2].tolist() + [10000001]
+    expected = patents['nb_patents'][:2].tolist() + [np.nan]
+
+    monkeypatch.setattr(batchsearch, 'Patent', FailingPatent)
+    X = batchsearch.fetch_companies(companies(ids), client = ShuffledClient(set(ids)))
+    np.testing.assert_array_equal(X['nb_patents'], expected)
+
+    # a stalled query is not waited for after the deadline
+    monkeypatch.setattr(batchsearch, 'Patent', StalledPatent)
+    start = time.monotonic()
+    X = batchsearch.fetch_companies(companies(ids), deadline = 0.2,
+                                    client = ShuffledClient(set(ids)))
+    assert time.monotonic() - start < 0.9
+    np.testing.assert_array_equal(X['nb_patents'], expected)
+
+
+def test_predict_companies(monkeypatch):
+    monkeypatch.setattr(batchsearch, 'Patent', BulkPatent)
+    X = batchsearch.predict_companies(companies([12, 404, 7]), HalfModel(),
+                                      client = ShuffledClient({12, 7}))
+    assert X['id'].tolist() == [12, 7]
+    assert X['prediction'].tolist() == [1, 0]
+    assert X['prediction_proba'].tolist() == [0.75, 0.25]
@@ -0,0 +1,102 @@
+# -*- coding: UTF-8 -*-
+
+# Import from standard library
+import sqlite3
+import time
+# Import from our lib
+from bpideep import lookup
+from bpideep.cache import SQLiteCache, MemoryCache
+from bpideep.patentcache import PatentCache
+from bpideep.responsecache import ResponseCache
+
+
+def test_sqlite_cache_ttl_and_lru(tmp_path):
+    cache = SQLiteCache(str(tmp_path / 'cache.sqlite'), ttl = 60, max_entries = 2,
+                        touch_interval = 0)
+    cache.set(['a', 1], 1, cost = 100)
+    cache.set(['b', 1], 2)
+    assert cache.get(['a', 1]) == 1
+    # 'b' is now the least recently used entry
+    time.sleep(0.01)
+    cache.set(['c', 1], 3)
+    assert cache.get(['b', 1]) is None
+    assert cache.get(['c', 1]) == 3
+    assert cache.stats() == {'hits': 2, 'misses': 1, 'cost_saved': 100, 'entries': 2}
+
+    expired = SQLiteCache(cache.path, ttl = 0)
+    assert expired.get(['a', 1]) is None
+
+
+def test_sqlite_cache_hits_do_not_write(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    cache = SQLiteCache(path, ttl = 60, flush_interval = 3600)
+    cache.set(['a', 1], 1, cost = 10)
+    with sqlite3.connect(path) as conn:
+        last_access = conn.execute('SELECT last_access FROM entries').fetchone()[0]
+
+    # another process holds the write lock: the hits still answer
+    lock = sqlite3.connect(path, timeout = 0)
+    lock.execute('BEGIN IMMEDIATE')
+    try:
+        assert [cache.get(['a', 1]) for _ in range(3)] == [1, 1, 1]
+    finally:
+        lock.rollback()
+        lock.close()
+
+    with sqlite3.connect(path) as conn:
+        assert conn.execute('SELECT last_access FROM entries').fetchone()[0] == last_access
+        assert conn.execute("SELECT value FROM counters WHERE name = 'hits'").fetchone() is None
+    # the counters are written by stats (or the next set)
+    assert cache.stats() == {'hits': 3, 'misses': 0, 'cost_saved': 30, 'entries': 1}
+    assert SQLiteCache(path).stats()['hits'] == 3
+
+
+def test_patent_cache_lazy_and_out_of_the_source_tree(monkeypatch, tmp_path):
+    monkeypatch.delenv('BPIDEEP_CACHE_DIR')
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path))
+    monkeypatch.setattr(lookup, 'patent_cache', None)
+    cache = lookup.get_patent_cache()
+    assert cache.path == str(tmp_path / 'bpideep' / 'patents.sqlite')
+    assert lookup.get_patent_cache() is cache
+
+
+def test_patent_cache_shared_by_path(tmp_path):
+    path = str(tmp_path / 'patents.sqlite')
+    PatentCache(path).set_counts({'ALPHA': 2, 'BETA': 0}, bytes_processed = 10)
+    cache = PatentCache(path)
+    assert cache.get_nb_patents('BETA') == 0
+    assert cache.get_nb_patents('GAMMA') is None
+    assert cache.stats()['bytes_saved'] == 5
+
+
+def test_memory_cache_ttl_and_lru():
+    cache = MemoryCache(ttl = 60, max_entries = 2)
+    cache.set(['a', 1], 1)
+    cache.set(['b', 1], 2)
+    assert cache.get(['a', 1]) == 1
+    cache.set(['c', 1], 3)
+    assert cache.get(['b', 1]) is None
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'entries': 2}
+
+    cache.ttl = 0
+    assert cache.get(['c', 1]) is None
+
+
+def test_response_cache_invalidated_by_model_versions(tmp_path):
+    path = str(tmp_path / 'responses.sqlite')
+    versions = {'main': (1, 10), 'lab': (2, 20)}
+    cache = ResponseCache(ttl = 60, shared = True, path = path)
+    cache.set('Deep  Tech', versions, {'prediction': '1'})
+
+    response, max_age = cache.get('deep tech', versions)
+    assert response == {'prediction': '1'}
+    assert 0 < max_age <= 60
+
+    # another worker finds it in the shared file
+    assert ResponseCache(ttl = 60, shared = True, path = path).get('DEEP TECH', versions)[0] \
+        == {'prediction': '1'}
+
+    # a hot swapped model changes the key and drops the memory entries
+    swapped = dict(versions, main = (3, 10))
+    assert cache.get('deep tech', swapped) == (None, 0)
+    assert cache.memory.stats()['entries'] == 0
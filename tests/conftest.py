@@ -0,0 +1,10 @@
+# -*- coding: UTF-8 -*-
+""" The caches of the tests are written in a temporary directory,
+neither in the source tree nor in the user cache
+"""
+
+# Import from standard library
+import os
+import tempfile
+
+os.environ['BPIDEEP_CACHE_DIR'] = tempfile.mkdtemp(prefix='bpideep-tests-')
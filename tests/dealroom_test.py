@@ -0,0 +1,92 @@
+# -*- coding: UTF-8 -*-
+
+# Import from standard library
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+# Import from third party
+import pytest
+# Import from our lib
+from bpideep.dealroom import DealRoomClient, split
+from bpideep.getdata import getbatchdata
+
+
+# recorded batch responses: one company per id, in a different order than asked
+def batch_response(ids, fields):
+    items = [{field: (int(id_) if field == 'id' else f'{field} {id_}') for field in fields}
+             for id_ in reversed(ids)]
+    return {'total': len(items), 'items': items}
+
+
+class StubDealRoom(BaseHTTPRequestHandler):
+    # statuses to send before the recorded responses, e.g. [429, 503]
+    failures = []
+    calls = []
+    lock = threading.Lock()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        ids = query['ids'][0].split(',')
+        fields = query['fields'][0].split(',')
+        with self.lock:
+            self.calls.append(ids)
+            status = self.failures.pop(0) if self.failures else 200
+
+        if status == 200:
+            body = batch_response(ids, fields)
+        else:
+            body = {'error': 'stub failure'}
+        content = json.dumps(body).encode()
+
+        self.send_response(status)
+        if status == 429:
+            self.send_header('Retry-After', '0')
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_url():
+    StubDealRoom.failures = []
+    StubDealRoom.calls = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubDealRoom)
+    thread = threading.Thread(target = server.serve_forever, daemon = True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+def test_batches_keep_the_chunks_order(stub_url):
+    client = DealRoomClient(api_key = 'key', url = stub_url, backoff = 0)
+    ids = [str(i) for i in range(120)]
+    answers = client.get_batches(ids, ['id', 'name'], chunk_size = 50)
+
+    assert len(StubDealRoom.calls) == 3
+    assert [len(answer['items']) for answer in answers] == [50, 50, 20]
+    assert [sorted(item['id'] for item in answer['items']) for answer in answers] == \
+        [[int(id_) for id_ in chunk] for chunk in split(ids, 50)]
+
+
+def test_retries_rate_limited_and_failed_calls(stub_url):
+    StubDealRoom.failures = [429, 503]
+    client = DealRoomClient(api_key = 'key', url = stub_url, backoff = 0)
+    X = getbatchdata(['1', '2'], ['id', 'name'], client = client)
+
+    assert len(StubDealRoom.calls) == 3
+    assert sorted(X['id']) == [1, 2]
+    assert set(X['name']) == {'name 1', 'name 2'}
+
+
+def test_returns_the_error_after_the_last_retry(stub_url):
+    StubDealRoom.failures = [503, 503]
+    client = DealRoomClient(api_key = 'key', url = stub_url, max_retries = 1, backoff = 0)
+    assert getbatchdata(['1'], ['id'], client = client) == {'error': 'stub failure'}
+    assert len(StubDealRoom.calls) == 2
@@ -0,0 +1,65 @@
+# -*- coding: UTF-8 -*-
+
+# Import from standard library
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+# Import from our lib
+from bpideep.encoders import FeatEncoder, LabFeatEncoder
+from bpideep.feateng import feat_eng, all_tags, KEPT_TAGS, SIMPLE_FEATURES
+from tests.fixtures import make_companies
+
+
+def test_feat_encoder_fixed_feature_space():
+    X = make_companies(300)
+    encoder = FeatEncoder()
+    features = encoder.fit_transform(X.copy())
+    pd.testing.assert_frame_equal(features, feat_eng(X.copy()).astype(np.float32))
+    pd.testing.assert_frame_equal(encoder.transform(X.copy()), features)
+
+    # a tag never seen when fitting stays 0
+    assert 'saas_tags' not in encoder.vocabulary_
+    new = make_companies(3, seed = 1)
+    new['tags'] = [['saas'], [], ['biotechnology']]
+    new_features = encoder.transform(new.copy())
+    assert new_features.columns.tolist() == encoder.features_list
+    assert new_features['saas_tags'].tolist() == [0, 0, 0]
+
+    # a row gets the same features alone or in a batch
+    pd.testing.assert_frame_equal(encoder.transform(new.iloc[[2]].copy()),
+                                  new_features.iloc[[2]].reset_index(drop = True))
+
+
+def test_lab_feat_encoder_columns():
+    X = make_companies(50)
+    encoder = LabFeatEncoder().fit(X.copy())
+    features = encoder.transform(X.copy())
+    assert features.columns.tolist() == ['doctor_yesno', 'nb_patents', 'department']
+    assert len(features) == 50
+
+
+def test_feat_encoder_sparse_matches_dense():
+    X = make_companies(300)
+    dense = FeatEncoder()
+    sparse = FeatEncoder(sparse = True)
+    features = sparse.fit_transform(X.copy())
+    assert sp.isspmatrix_csr(features)
+    np.testing.assert_array_equal(features.toarray(), dense.fit_transform(X.copy()).to_numpy())
+    assert sparse.vocabulary_ == dense.vocabulary_
+    assert sparse.features_list == dense.features_list
+
+    new = make_companies(40, seed = 1)
+    np.testing.assert_array_equal(sparse.transform(new.copy()).toarray(),
+                                  dense.transform(new.copy()).to_numpy())
+
+
+def test_feat_encoder_sparse_full_vocabulary():
+    X = make_companies(200)
+    tags = all_tags(X.copy())
+    assert set(KEPT_TAGS) - {'saas_tags'} <= set(tags)
+    encoder = FeatEncoder(sparse = True, kept_tags = tags)
+    features = encoder.fit_transform(X.copy())
+    assert features.shape == (200, len(SIMPLE_FEATURES) + len(tags))
+    # same columns as the dense encoding of the same tags
+    dense = FeatEncoder(kept_tags = tags).fit_transform(X.copy())
+    np.testing.assert_array_equal(features.toarray(), dense.to_numpy())
@@ -0,0 +1,177 @@
+# -*- coding: UTF-8 -*-
+
+# Import from standard library
+import json
+import os
+import numpy as np
+import pandas as pd
+import pytest
+# Import from our lib
+from bpideep import feateng
+from bpideep.feateng import encoder, feat_eng, feat_eng_cols, background, degree, \
+    industries, investors_name, investors_type, KEPT_TAGS, numeric_features, department, \
+    convert, convert_zips, extract_nested, degree_quant, \
+    NESTED_FEATURES, INDICATOR_DTYPE, FEATURE_DTYPE, enforce_dtypes
+from tests.fixtures import make_companies
+from tests.reference import rowwise_numeric_features, baseline_department
+
+ENCODED_COLUMNS = ['background', 'degree', 'industry', 'income_streams',
+                   'technologies', 'investors_name', 'investors_type', 'tags']
+
+
+def nb_companies():
+    # size of the training set
+    json_path = os.path.join(os.path.dirname(feateng.__file__), 'data', 'companies.json')
+    with open(json_path) as f:
+        return sum(len(ids) for ids in json.load(f).values())
+
+
+def list_columns(data):
+    data['background'] = data['team'].map(background)
+    data['degree'] = data['team'].map(degree)
+    data['industry'] = data['industries'].map(industries)
+    data['investors_name'] = data['investors'].map(investors_name)
+    data['investors_type'] = data['investors'].map(investors_type)
+    return data
+
+
+def iterrows_encoder(data, column):
+    '''the original row by row encoder'''
+    list_ = []
+    for row in data[column]:
+        for elt in row:
+            elt_tagged = f"{elt}_{column}"
+            if elt_tagged not in list_:
+                list_.append(elt_tagged)
+    if len(list_) == 0:
+        return pd.DataFrame()
+    data_encoded = pd.DataFrame(columns = list_)
+    for index, row in data.iterrows():
+        data_ = row[column]
+        dict_ = {}
+        for tag in list_:
+            # strips the characters of "_{column}", not the suffix
+            tag_strip = tag.strip(f"_{column}")
+            dict_[tag] = 1 if tag_strip in data_ else 0
+        data_encoded.loc[index] = dict_
+    return data_encoded
+
+
+def test_encoder_matches_iterrows_encoder():
+    data = list_columns(make_companies(nb_companies()))
+    for column in ENCODED_COLUMNS:
+        # the row by row encoder takes minutes on the ~700 tags vocabulary
+        if column == 'tags':
+            data = data.iloc[:300]
+        expected = iterrows_encoder(data, column)
+        result = encoder(data, column)
+        pd.testing.assert_frame_equal(result, expected.astype(result.dtypes.to_dict()))
+
+        matrix, columns = encoder(data, column, sparse = True)
+        assert columns == result.columns.tolist()
+        assert (matrix.toarray() == result.values).all()
+
+
+def test_encoder_strips_characters():
+    data = pd.DataFrame({'tags': [['saas', 'neurology'], ['ai'], []]}, index = [3, 1, 2])
+    result = encoder(data, 'tags')
+    assert result.columns.tolist() == ['saas_tags', 'neurology_tags', 'ai_tags']
+    # 'saas_tags'.strip('_tags') is '' so the column never matches
+    assert result['saas_tags'].tolist() == [0, 0, 0]
+    assert result['neurology_tags'].tolist() == [1, 0, 0]
+    assert result.index.tolist() == [3, 1, 2]
+    assert encoder(data.iloc[2:], 'tags').empty
+
+
+
+def wide_feat_eng(data, kept_tags):
+    '''encodes every tag, then selects the kept ones as feat_eng used to'''
+    features, simple_features = feat_eng_cols(data.copy(), kept_tags = [])
+    data = list_columns(data)
+    wide_df = pd.concat([encoder(data, column) for column in ENCODED_COLUMNS], axis = 1)
+    for tag in kept_tags:
+        if tag not in wide_df.columns:
+            wide_df[tag] = np.zeros(len(wide_df), dtype = np.uint8)
+    return pd.concat([features, wide_df.reset_index(drop = True)], axis = 1)[simple_features + kept_tags]
+
+
+def test_feat_eng_only_encodes_kept_tags():
+    data = make_companies(500)
+    pd.testing.assert_frame_equal(feat_eng(data.copy()), wide_feat_eng(data.copy(), KEPT_TAGS))
+
+    # tags that never appear are zeros
+    kept_tags = ['ai_technologies', 'unknown_tags', 'PhD_degree']
+    result, kept_cols = feat_eng_cols(data.copy(), kept_tags = kept_tags)
+    assert kept_cols[-3:] == kept_tags
+    pd.testing.assert_frame_equal(result, wide_feat_eng(data.copy(), kept_tags))
+    assert result['unknown_tags'].sum() == 0
+
+
+
+def test_numeric_features_match_rowwise():
+    data = make_companies(1000)
+    data.loc[:9, 'employees_latest'] = 0
+    data.loc[10:19, 'launch_year'] = [2020, 2021, 2025, np.nan, 2019, 2020, 2000, np.nan, 1990, 2020]
+    data['has_strong_founder'] = data['has_strong_founder'].astype(object)
+    data.loc[20:24, 'has_strong_founder'] = None
+    for reference_year in [2020, 2024]:
+        expected = rowwise_numeric_features(data, reference_year)
+        features = numeric_features(data, reference_year)
+        for feature, values in expected.items():
+            np.testing.assert_array_equal(features[feature], values.to_numpy(dtype = float))
+    assert features['has_super_founder'].dtype == np.int64
+
+
+def test_department_matches_baseline():
+    data = make_companies(600)
+    # the baseline join is only one row per company without repeated ids
+    idzip_ids = feateng.load_idzip()['id']
+    assert data['id'].is_unique
+    assert not idzip_ids[idzip_ids.isin(data['id'])].duplicated().any()
+    zips = ['91190', ' 75002', '+3800', '7_0', 'abc', '', None, 35000, '67']
+    for i, zip_ in enumerate(zips):
+        data.at[i, 'hq_locations'] = [{'zip': zip_}]
+    np.testing.assert_array_equal(convert_zips(zips), [convert(zip_) for zip_ in zips])
+    for target_zip in [feateng.TARGET_ZIP, [75, -1]]:
+        np.testing.assert_array_equal(department(data, target_zip), baseline_department(data, target_zip))
+
+
+
+def test_extract_nested_matches_map_functions():
+    data = make_companies(500)
+    data.at[0, 'investors'] = {'total': 0, 'items': [{'name': 'ignored', 'type': 'fund'}]}
+    nested = extract_nested(data, NESTED_FEATURES)
+    expected = list_columns(data.copy())
+    for column in ['background', 'degree', 'industry', 'investors_name', 'investors_type']:
+        assert nested[column] == expected[column].tolist()
+    assert nested['investors_name'][0] == []
+    assert nested['doctor_yesno'].tolist() == expected['degree'].map(degree_quant).tolist()
+    assert nested['hq_zip'] == [locations[0]['zip'] if locations else None
+                                for locations in data['hq_locations']]
+    assert nested['has_hq'].tolist() == [len(locations) > 0 for locations in data['hq_locations']]
+
+    # only the requested sources are read
+    assert set(extract_nested(data[['team']], ['doctor_yesno'])) == {'doctor_yesno'}
+
+
+
+def test_feat_eng_cols_dtype_contract():
+    features, kept_cols = feat_eng_cols(make_companies(100))
+    dtypes = features.dtypes.to_dict()
+    for column in ['doctor_yesno', 'has_strong_founder', 'has_super_founder'] + KEPT_TAGS:
+        assert dtypes[column] == INDICATOR_DTYPE
+    for column in ['funding_employees_ratio', 'stage_age_ratio', 'nb_patents']:
+        assert dtypes[column] == FEATURE_DTYPE
+
+    # a missing founder flag stays NaN for the imputer, as in the baseline
+    data = make_companies(10)
+    data.loc[3, 'has_strong_founder'] = None
+    features, _ = feat_eng_cols(data)
+    assert features['has_strong_founder'].dtype == FEATURE_DTYPE
+    expected = [np.nan if i == 3 else int(data.loc[i, 'has_strong_founder']) for i in range(10)]
+    np.testing.assert_array_equal(features['has_strong_founder'], expected)
+    assert features['has_super_founder'].dtype == INDICATOR_DTYPE
+
+    # an indicator cannot hold other values
+    with pytest.raises(ValueError, match = 'doctor_yesno'):
+        enforce_dtypes(pd.DataFrame({'doctor_yesno': [0, 2]}))
@@ -0,0 +1,92 @@
+# -*- coding: UTF-8 -*-
+""" Synthetic DealRoom companies for the feature engineering tests, \
+and stubs of the remote calls
+"""
+
+# Import from standard library
+import os
+import numpy as np
+import pandas as pd
+# Import from our lib
+from bpideep.list import list_industries, list_technologies, list_tags, \
+    list_background_team, list_income_streams, list_investors_name, list_investor_type
+
+DEGREES = ['PhD', 'Doctor', 'Master', 'Bachelor', 'MBA']
+STAGES = ['seed', 'early growth', 'late growth', 'mature', None]
+ZIPS = ['91190', '75002', '38000', '', '6700', 'abcde']
+
+
+def known_ids():
+    """ ids present in patents.csv and id_zip.csv, so that the lookups match
+    """
+    data_path = os.path.join(os.path.dirname(__file__), '..', 'bpideep', 'data')
+    patents_ids = pd.read_csv(os.path.join(data_path, 'patents.csv'))['id'][:50]
+    zip_ids = pd.read_csv(os.path.join(data_path, 'id_zip.csv'), delimiter=';')['id'][:50]
+    return list(dict.fromkeys(list(patents_ids) + list(zip_ids)))
+
+
+def pick(random, values, high):
+    size = random.randint(0, high + 1)
+    return [values[i] for i in random.randint(0, len(values), size)]
+
+
+def make_companies(n, seed=0):
+    """ returns a dataframe of n companies shaped like the DealRoom batch
+    responses used by the feature engineering
+    """
+    random = np.random.RandomState(seed)
+    ids = known_ids()
+    rows = []
+    for i in range(n):
+        team = {'items': [
+            {'backgrounds': [{'name': name} for name in pick(random, list_background_team, 2)],
+             'universities': {'items': [] if random.rand() < 0.3 else
+                              [{'degree': None if random.rand() < 0.2 else
+                                {'name': DEGREES[random.randint(len(DEGREES))]}}]}}
+            for _ in range(random.randint(0, 4))]}
+        investors = [{'name': name, 'type': list_investor_type[random.randint(len(list_investor_type))]}
+                     for name in pick(random, list_investors_name, 3)]
+        rows.append({
+            'id': int(ids[i]) if i < len(ids) else 10000000 + i,
+            'name': f'company {i}',
+            'team': team,
+            'industries': [{'name': name} for name in pick(random, list_industries, 3)],
+            'income_streams': pick(random, list_income_streams, 2),
+            'technologies': pick(random, list_technologies, 3),
+            'tags': pick(random, list_tags, 5),
+            'investors': {'total': len(investors), 'items': investors},
+            'growth_stage': STAGES[random.randint(len(STAGES))],
+            'launch_year': float(random.randint(2000, 2021)) if random.rand() > 0.05 else np.nan,
+            'has_strong_founder': bool(random.rand() < 0.3),
+            'has_super_founder': bool(random.rand() < 0.1),
+            'total_funding_source': float(random.randint(0, 10**7)) if random.rand() > 0.2 else np.nan,
+            'employees_latest': float(random.randint(1, 200)),
+            'hq_locations': [] if random.rand() < 0.1 else
+            [{'zip': ZIPS[random.randint(len(ZIPS))], 'city': {'name': 'city'}}],
+        })
+    return pd.DataFrame(rows)
+
+
+def make_answers(nb_ids, fields_list, chunk_size=50):
+    """ (company_type, answer) pairs of nb_ids synthetic companies,
+    split between the three labels like the training ids
+    """
+    labelled_answers = []
+    labels = ['deeptech', 'non_deeptech', 'almost_deeptech']
+    for start in range(0, nb_ids, chunk_size):
+        items = [{field: (i if field == 'id' else f'{field} {i}') for field in fields_list}
+                 for i in range(start, min(start + chunk_size, nb_ids))]
+        company_type = labels[3 * start // nb_ids]
+        labelled_answers.append((company_type, {'total': len(items), 'items': items}))
+    return labelled_answers
+
+
+class BulkPatent():
+    """ Patent counting len(name) patents for each name, without BigQuery
+    """
+
+    def __init__(self, cache=None):
+        pass
+
+    def get_bulk_nb_patents(self, names, timeout=None):
+        return {name: len(name) for name in names}
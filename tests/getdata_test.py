@@ -0,0 +1,107 @@
+# -*- coding: UTF-8 -*-
+
+# Import from standard library
+import io
+import threading
+import time
+# Import from third party
+import numpy as np
+import pandas as pd
+import pytest
+# Import from our lib
+from bpideep import getdata
+from bpideep.getdata import answers_data, compact_dtypes
+from bpideep.searchcache import CompanySearchCache
+from tests.fixtures import make_answers
+from tests.reference import concat_data
+
+
+def to_csv(data):
+    output = io.StringIO()
+    data.to_csv(output, index = False)
+    return output.getvalue()
+
+
+def test_answers_data_same_csv_as_concat():
+    fields_list = ['id', 'name', 'tags']
+    labelled_answers = make_answers(230, fields_list)
+    # a company found under two labels keeps the first one
+    labelled_answers.append(('almost_deeptech', {'items': [{'id': 3, 'name': 'x', 'tags': 'y'}]}))
+
+    expected = to_csv(concat_data(labelled_answers, fields_list))
+    data = answers_data(labelled_answers, fields_list)
+    assert to_csv(data) == expected
+    assert list(data['target'][:3]) == [1, 1, 1]
+
+
+def test_compact_dtypes():
+    data = compact_dtypes(pd.DataFrame({
+        'growth_stage': ['seed', None, 'mature'],
+        'has_strong_founder': [True, False, True],
+        'has_super_founder': [True, None, False],
+        'launch_year': [2015., np.nan, 2001.],
+        'target': [1, 0, 0]}))
+    assert data['growth_stage'].dtype == 'category'
+    assert data['growth_stage'].isna().tolist() == [False, True, False]
+    assert data['has_strong_founder'].dtype == bool
+    # a missing flag is kept as it is
+    assert data['has_super_founder'].dtype == object
+    assert data['launch_year'].dtype == np.float32
+    assert data['target'].dtype == np.uint8
+
+
+def test_answers_data_raises_on_api_error():
+    with pytest.raises(ValueError):
+        answers_data([('deeptech', {'error': 'unauthorized'})], ['id'])
+
+
+@pytest.fixture
+def searches(monkeypatch, tmp_path):
+    """ DealRoom searches answered locally, through a fresh search cache
+    """
+    calls = []
+
+    def dealroom_search(name, match_type, timeout=None):
+        calls.append((name, match_type))
+        time.sleep(0.2)
+        if name.lower() == 'unknown':
+            return pd.DataFrame()
+        if name == 'error':
+            return {'error': 'unauthorized'}
+        return pd.DataFrame([{'id': 1, 'name': name.title(), 'tags': ['ai']}])
+
+    monkeypatch.setattr(getdata, 'dealroom_search', dealroom_search)
+    monkeypatch.setattr(getdata, 'search_cache',
+                        CompanySearchCache(str(tmp_path / 'companies.sqlite'), negative_ttl = 60))
+    return calls
+
+
+def test_search_cache_found_and_not_found(searches):
+    assert getdata.company_search('deep tech')['name'][0] == 'Deep Tech'
+    assert getdata.company_search('Deep  Tech')['tags'][0] == ['ai']
+    assert getdata.company_search('unknown').empty
+    assert getdata.company_search('UNKNOWN').empty
+    assert getdata.company_search('error') == {'error': 'unauthorized'}
+    assert getdata.company_search('error') == {'error': 'unauthorized'}
+    # exact hits serve the fuzzy searches, exact misses do not
+    assert getdata.company_search_fuzzy('deep tech')['name'][0] == 'Deep Tech'
+    assert getdata.company_search_fuzzy('unknown').empty
+    assert searches == [('deep tech', 'exact'), ('unknown', 'exact'), ('error', 'exact'),
+                        ('error', 'exact'), ('unknown', 'fuzzy')]
+
+    # not found expires after negative_ttl
+    getdata.search_cache.negative_ttl = 0
+    getdata.company_search('unknown')
+    assert searches[-1] == ('unknown', 'exact')
+
+
+def test_search_cache_single_flight(searches):
+    results = []
+    threads = [threading.Thread(target = lambda: results.append(getdata.company_search('deep tech')))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert searches == [('deep tech', 'exact')]
+    assert [company['name'][0] for company in results] == ['Deep Tech'] * 5
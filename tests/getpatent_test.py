@@ -0,0 +1,95 @@
+# -*- coding: UTF-8 -*-
+
+# Import from standard library
+import pandas as pd
+import pytest
+# Import from our lib
+from bpideep import getpatent
+from bpideep.getpatent import Patent
+from bpideep.patentcache import PatentCache
+
+# small stand-in for the publications tables: (publication_number, \
+# country_code, assignee_harmonized names, top_terms, nb_similar)
+PUBLICATIONS = [
+    ('FR-1-A', 'FR', ['ALPHA', 'BETA'], ['laser'], 3),
+    ('FR-2-A', 'FR', ['ALPHA'], ['optics'], 0),
+    ('US-3-A', 'US', ['GAMMA'], ['battery'], 5),
+    ('EP-4-A', 'EP', ['BETA', 'BETA'], ['cell'], 1),
+]
+
+
+class Job():
+    total_bytes_processed = 1024
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def result(self, timeout=None):
+        return self.rows
+
+
+class LocalClient():
+    '''runs the bulk queries of Patent over PUBLICATIONS'''
+
+    def __init__(self):
+        self.queries = 0
+
+    def query(self, sql, job_config=None):
+        if job_config.dry_run:
+            return Job([])
+        self.queries += 1
+        names = job_config.query_parameters[0].values
+        # CROSS JOIN UNNEST(assignees) JOIN UNNEST(@names): one row per \
+        # assignee entry equal to a name
+        matches = [(name, publication) for publication in PUBLICATIONS
+                   for assignee in publication[2] for name in names if assignee == name]
+        if 'GROUP BY company_name' in sql:
+            assert 'COUNT(DISTINCT patents.publication_number)' in sql
+            counts = pd.DataFrame([(name, publication[0]) for name, publication in matches],
+                                  columns=['name', 'publication']).groupby('name')['publication'].nunique()
+            return Job(list(counts.items()))
+        return Job([(name,) + publication for name, publication in matches])
+
+
+@pytest.fixture(autouse=True)
+def row_results(monkeypatch):
+    # the stand-in client returns rows, not Storage Read API streams
+    monkeypatch.setattr(getpatent, 'BQSTORAGE', False)
+
+
+def test_get_bulk_patents_counts_single_query():
+    client = LocalClient()
+    patent = Patent(client=client)
+    data = pd.DataFrame({'id': [1, 2, 3, 4], 'name': ['alpha', 'Beta', 'delta', "al-pha"]})
+    data['clean_name'] = patent.name_clean(data['name'])
+
+    df, counts = patent.get_bulk_patents_counts(data)
+
+    assert client.queries == 1
+    assert counts['nb_patents'].tolist() == [2, 2, 0, 0]
+    assert sorted(df.loc[df['id'] == 2, 'id_patents']) == ['EP-4-A', 'FR-1-A']
+    assert df.columns.tolist() == ['id', 'id_patents', 'country_code',
+                                   'harmonized_assignee', 'top_terms', 'nb_similar']
+
+
+def test_get_bulk_nb_patents():
+    patent = Patent(client=LocalClient())
+    # EP-4-A lists BETA twice but counts once
+    assert patent.get_bulk_nb_patents(['Alpha', 'gamma', 'zeta', 'beta']) == \
+        {'Alpha': 2, 'gamma': 1, 'zeta': 0, 'beta': 2}
+
+
+def test_get_bulk_nb_patents_queries_cache_misses(tmp_path):
+    client = LocalClient()
+    patent = Patent(client=client, cache=PatentCache(str(tmp_path / 'patents.sqlite')))
+    assert patent.get_bulk_nb_patents(['Alpha', 'zeta']) == {'Alpha': 2, 'zeta': 0}
+    assert patent.get_bulk_nb_patents(['zeta', 'alpha']) == {'zeta': 0, 'alpha': 2}
+    assert client.queries == 1
+
+
+def test_dry_run_reports_bytes_before_running():
+    client = LocalClient()
+    patent = Patent(client=client, dry_run=True)
+    patent.get_bulk_nb_patents(['Alpha'])
+    assert patent.bytes_estimates == [1024]
+    assert client.queries == 1
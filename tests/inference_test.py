@@ -0,0 +1,74 @@
+# -*- coding: UTF-8 -*-
+
+# Import from standard library
+import numpy as np
+import pandas as pd
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import RobustScaler
+# Import from our lib
+from bpideep import trainer, labtrainer
+from bpideep.feateng import funding_amounts_employees, get_stage_age_ratio
+from bpideep.inference import Timer, predict_all
+from tests.fixtures import make_companies
+
+
+def fit_models(X, y):
+    models = {}
+    for name, module in [('main', trainer), ('lab', labtrainer)]:
+        t = module.Trainer(X.copy(), y)
+        t.set_pipeline()
+        t.pipeline.fit(t.X, y)
+        models[name] = t.pipeline
+    X_time = pd.DataFrame({'funding_employees_ratio': funding_amounts_employees(X),
+                           'stage_age_ratio': get_stage_age_ratio(X.copy())})
+    models['time'] = make_pipeline(SimpleImputer(strategy = 'mean'), RobustScaler(),
+                                   LogisticRegression()).fit(X_time, y)
+    return models
+
+
+def test_predict_all_matches_separate_models():
+    X = make_companies(300)
+    X['nb_patents'] = np.where(np.arange(300) % 3 == 0, np.nan, np.arange(300) % 7)
+    y = pd.Series(np.arange(300) % 2)
+    models = fit_models(X, y)
+
+    new = make_companies(40, seed = 1)
+    new['nb_patents'] = np.arange(40) % 5
+    timer = Timer()
+    features, results = predict_all(new.copy(), models, timer)
+
+    assert list(timer.timings) == ['features', 'main', 'time', 'lab']
+    np.testing.assert_allclose(results['prediction_proba'],
+                               models['main'].predict_proba(new.copy())[:, 1])
+    np.testing.assert_array_equal(results['prediction'], models['main'].predict(new.copy()))
+    np.testing.assert_allclose(results['lab_predict'],
+                               models['lab'].predict_proba(new.copy())[:, 1])
+    X_time = pd.DataFrame({'funding_employees_ratio': funding_amounts_employees(new),
+                           'stage_age_ratio': get_stage_age_ratio(new.copy())})
+    np.testing.assert_allclose(results['time_predict'],
+                               models['time'].predict_proba(X_time)[:, 1])
+
+
+def test_predict_all_sparse_main_model():
+    X = make_companies(300)
+    y = pd.Series(np.arange(300) % 2)
+    models = fit_models(X, y)
+    t = trainer.Trainer(X.copy(), y)
+    t.set_pipeline(sparse = True)
+    models['main'] = t.pipeline.fit(t.X, y)
+
+    new = make_companies(40, seed = 1)
+    new['nb_patents'] = np.arange(40) % 5
+    features, results = predict_all(new.copy(), models)
+
+    np.testing.assert_allclose(results['prediction_proba'],
+                               models['main'].predict_proba(new.copy())[:, 1])
+    np.testing.assert_allclose(results['lab_predict'],
+                               models['lab'].predict_proba(new.copy())[:, 1])
+    # the features of the responses, without densifying the tags
+    assert features.columns.tolist() == models['main'].named_steps['featureencoder'].features_list
+    assert all(isinstance(dtype, pd.SparseDtype) for dtype in features.dtypes)
+    assert features.fillna(0).iloc[[0]].reset_index(drop = True).to_dict()['doctor_yesno'][0] \
+        in (0, 1)
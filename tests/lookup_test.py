@@ -0,0 +1,93 @@
+# -*- coding: UTF-8 -*-
+
+# Import from standard library
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+# Import from our lib
+from bpideep import lookup
+from tests.fixtures import BulkPatent
+
+
+class SlowPatent():
+    def __init__(self, cache=None):
+        pass
+
+    def get_nb_patents(self, name, timeout=None):
+        time.sleep(1)
+        return 1000
+
+
+def test_company_lookup_falls_back_to_local_patents(monkeypatch):
+    patent_id = lookup.feateng.load_patents()['id'].iloc[0]
+    expected = lookup.feateng.load_patents()['nb_patents'].iloc[0]
+
+    def company_search(name, timeout=None):
+        time.sleep(0.1)
+        return pd.DataFrame({'id': [patent_id], 'name': [name]})
+
+    monkeypatch.setattr(lookup, 'company_search', company_search)
+    monkeypatch.setattr(lookup, 'Patent', SlowPatent)
+
+    start = time.monotonic()
+    company, nb_patents = lookup.company_lookup('name', patent_timeout = 0.3)
+    assert time.monotonic() - start < 0.9
+    assert company['name'][0] == 'name'
+    assert nb_patents == expected
+
+
+class BatchClient():
+    def get_batches(self, ids, fields_list, timeout=None):
+        return [{'items': [{'id': int(id_), 'name': f'company {id_}'}
+                           for id_ in ids if id_ != '404']}]
+
+
+def test_companies_lookup_by_names(monkeypatch):
+    def company_search(name, timeout=None):
+        if name == 'unknown':
+            return pd.DataFrame()
+        if name == 'late':
+            time.sleep(1)
+        return pd.DataFrame({'id': [len(name)], 'name': [name.upper()]})
+
+    monkeypatch.setattr(lookup, 'company_search', company_search)
+    monkeypatch.setattr(lookup, 'Patent', BulkPatent)
+
+    X, errors = lookup.companies_lookup(names = ['ab', 'unknown', 'late', 'ab', 'abcd'],
+                                        dealroom_timeout = 0.3)
+    assert errors == {'unknown': 'not_found', 'late': 'timeout'}
+    assert list(X['query']) == ['ab', 'abcd']
+    assert list(X['name']) == ['AB', 'ABCD']
+    # patents counted for the searched names
+    assert list(X['nb_patents']) == [2, 4]
+
+
+def test_companies_lookup_by_ids(monkeypatch):
+    monkeypatch.setattr(lookup, 'Patent', BulkPatent)
+    X, errors = lookup.companies_lookup(ids = [12, '404', 7], client = BatchClient())
+    assert errors == {'404': 'not_found'}
+    assert list(X['query']) == ['12', '7']
+    assert list(X['nb_patents']) == [len('company 12'), len('company 7')]
+
+
+def test_companies_lookup_cancels_searches_after_the_deadline(monkeypatch):
+    searched = []
+
+    def company_search(name, timeout=None):
+        searched.append(name)
+        time.sleep(0.3)
+        return pd.DataFrame({'id': [len(name)], 'name': [name]})
+
+    monkeypatch.setattr(lookup, 'company_search', company_search)
+    monkeypatch.setattr(lookup, 'Patent', BulkPatent)
+
+    # the batches run on their own threads, not on the /predict ones
+    assert lookup.batch_executor is not lookup.executor
+    with ThreadPoolExecutor(max_workers = 2) as executor:
+        X, errors = lookup.companies_lookup(names = [f'name {i}' for i in range(10)],
+                                            deadline = 0.1, executor = executor)
+    assert X.empty
+    assert set(errors.values()) == {'timeout'}
+    # the searches started before the deadline took the two threads, \
+    # the queued ones were cancelled
+    assert len(searched) <= 2
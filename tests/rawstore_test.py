@@ -0,0 +1,60 @@
+# -*- coding: UTF-8 -*-
+
+# Import from our lib
+from bpideep.getdata import answers_data
+from bpideep.rawstore import RawStore
+
+
+class FakeDealRoom():
+    """ batch calls answered from a dict of companies, recording the asked ids
+    """
+
+    def __init__(self, companies):
+        self.companies = companies
+        self.calls = []
+
+    def get_batches(self, company_id_list, fields_list, chunk_size=50):
+        self.calls.append((list(company_id_list), list(fields_list)))
+        items = [{field: self.companies[id_][field] for field in fields_list}
+                 for id_ in company_id_list if id_ in self.companies]
+        return [{'items': items}]
+
+
+def company(id_, updated):
+    return {'id': int(id_), 'name': f'company {id_}', 'last_updated_utc': updated,
+            'team': {'items': [{'backgrounds': [{'name': 'phd'}]}]}}
+
+
+def test_sync_refetches_only_new_and_updated_companies(tmp_path):
+    dealroom = FakeDealRoom({'1': company('1', 'a'), '2': company('2', 'a')})
+    fields_list = ['id', 'name', 'team']
+    store = RawStore(str(tmp_path / 'companies.jsonl'), client=dealroom)
+
+    store.sync(['1', '2'], fields_list)
+    assert dealroom.calls == [(['1', '2'], fields_list + ['last_updated_utc'])]
+
+    dealroom.companies['2'] = company('2', 'b')
+    dealroom.companies['3'] = company('3', 'a')
+    dealroom.calls = []
+    items = RawStore(store.path, client=dealroom).sync(['1', '2', '3'], fields_list)
+
+    # light call for the stored ids, full call for the new and updated ones
+    assert dealroom.calls == [(['1', '2'], ['id', 'last_updated_utc']),
+                              (['3', '2'], fields_list + ['last_updated_utc'])]
+    assert items['2']['last_updated_utc'] == 'b'
+    assert items['1']['team'] == {'items': [{'backgrounds': [{'name': 'phd'}]}]}
+
+
+def test_answers_read_locally(tmp_path):
+    dealroom = FakeDealRoom({'1': company('1', 'a'), '2': company('2', 'a')})
+    path = str(tmp_path / 'companies.jsonl')
+    RawStore(path, client=dealroom).sync(['1', '2'], ['id', 'name', 'team'])
+    dealroom.calls = []
+
+    store = RawStore(path, client=dealroom, refresh=False)
+    data = answers_data(store.answers({'deeptech': ['2'], 'non_deeptech': ['1', '4'],
+                                       'almost_deeptech': []}, ['id', 'name', 'team']),
+                        ['id', 'name', 'team'])
+    assert dealroom.calls == []
+    assert list(data['id']) == [2, 1]
+    assert list(data['target']) == [1, 0]
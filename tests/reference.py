@@ -0,0 +1,63 @@
+# -*- coding: UTF-8 -*-
+""" Previous implementations of the optimized functions: the references
+the tests check them against and the benchmarks time them against
+"""
+
+# Import from third party
+import pandas as pd
+# Import from our lib
+from bpideep import feateng
+from bpideep.feateng import convert, growth_stage_num, return_ratio
+
+
+def concat_data(labelled_answers, fields_list):
+    """ the previous getfulldata: one concat per batch on empty object frames
+    """
+    df_dict = {company_type: pd.DataFrame(columns=fields_list)
+               for company_type in ['deeptech', 'non_deeptech', 'almost_deeptech']}
+    for company_type, answer in labelled_answers:
+        df_dict[company_type] = pd.concat([df_dict[company_type], pd.DataFrame(answer['items'])],
+                                          axis=0, sort=False)
+    for company_type, df in df_dict.items():
+        df['deep_or_not'] = company_type
+        df['target'] = 1 if company_type == 'deeptech' else 0
+    data = pd.concat(df_dict.values(), axis=0, ignore_index=True)
+    data.drop_duplicates(subset='id', inplace=True)
+    data.reset_index(drop=True, inplace=True)
+    return data
+
+
+def rowwise_numeric_features(data, reference_year):
+    '''the original map / apply implementation'''
+    data = data.copy()
+    data['growth_stage_num'] = growth_stage_num(data)
+    data['year_of_existence'] = data['launch_year'].map(lambda x: reference_year - x)
+    return {'funding_employees_ratio': data['total_funding_source'] / data['employees_latest'],
+            'has_strong_founder': data['has_strong_founder'].map({True: 1, False: 0}),
+            'has_super_founder': data['has_super_founder'].map({True: 1, False: 0}),
+            'stage_age_ratio': data[['year_of_existence', 'growth_stage_num']].apply(return_ratio, axis = 1)}
+
+
+def baseline_department(data, target_zip):
+    '''
+    department as the baseline zip_code computed it: a join of the first HQ \
+    location of each company with id_zip.csv
+    the join adds rows for the ids that id_zip.csv or data repeat, so \
+    it only gives one value per company when the ids are repeated in neither
+    '''
+    idzip_df = feateng.load_idzip().copy()
+    idzip_df.set_index('id', inplace = True)
+    hq_locations = data[['id', 'hq_locations']].copy()
+    hq_locations['hq_locations'] = hq_locations['hq_locations'].apply(
+        lambda elt: None if len(elt) == 0 else elt[0])
+    hq_locations = hq_locations.dropna(axis = 0, subset = ['hq_locations'])
+    hq_df = pd.DataFrame(hq_locations['hq_locations'].to_list(), index = hq_locations['id'])
+    hq_df = hq_df[['zip']]
+    merged = hq_df.join(idzip_df).fillna(value = -1000)
+    merged.zip = merged.zip.apply(convert)
+    merged.ZIP = merged.ZIP.apply(lambda x: int(str(x)[0:2] if x != 0 else 0))
+    merged['zip_code'] = merged.apply(max, axis = 1)
+    final = merged.drop(columns = ['zip', 'ZIP'])
+    df = data[['id']].set_index('id').join(final, how = 'left').fillna(value = -1)
+    df['zip_code'] = df['zip_code'].astype('int')
+    return df['zip_code'].apply(lambda x: 1 if (x in target_zip) else 0).to_numpy()
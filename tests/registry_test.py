@@ -0,0 +1,34 @@
+# -*- coding: UTF-8 -*-
+
+# Import from standard library
+import os
+import joblib
+# Import from our lib
+from bpideep.registry import ModelRegistry
+
+
+def test_registry_hot_swap(tmp_path):
+    path = str(tmp_path / 'model.joblib')
+    joblib.dump({'version': 1}, path)
+    registry = ModelRegistry({'main': path}, check_interval=0).load()
+    first = registry.models()
+    assert registry.get('main') == {'version': 1}
+
+    joblib.dump({'version': 2}, path)
+    # make sure the modification time changes on coarse filesystems
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    assert registry.refresh(force=True) == ['main']
+    assert registry.get('main') == {'version': 2}
+    # snapshots taken before the swap are left untouched
+    assert first['main'] == {'version': 1}
+
+
+def test_registry_keeps_model_on_failed_reload(tmp_path):
+    path = str(tmp_path / 'model.joblib')
+    joblib.dump('model', path)
+    registry = ModelRegistry({'main': path}, check_interval=0).load()
+    os.remove(path)
+    assert registry.refresh(force=True) == []
+    assert registry.get('main') == 'model'
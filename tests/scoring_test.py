@@ -0,0 +1,64 @@
+# -*- coding: UTF-8 -*-
+
+# Import from standard library
+import json
+# Import from third party
+import numpy as np
+import pandas as pd
+# Import from our lib
+from bpideep import feateng
+from bpideep.inference import predict_all
+from bpideep.scoring import score, model_files_in, read_ids, ResultWriter, RESULT_COLUMNS
+from bpideep.training import train_all
+from tests.fixtures import make_companies
+
+
+def test_score_dump_in_chunks(tmp_path):
+    X = make_companies(200)
+    y = pd.Series(np.arange(200) % 2)
+    models = train_all(X, y, output_dir = str(tmp_path), n_jobs = 1)
+
+    companies = make_companies(130, seed = 1)
+    dump = str(tmp_path / 'companies.jsonl')
+    with open(dump, 'w') as f:
+        for item in companies.to_dict(orient = 'records'):
+            f.write(json.dumps(item) + '\n')
+
+    companies['nb_patents'] = companies['id'].map(feateng.patents_by_id())
+    features, expected = predict_all(companies.copy(), models)
+
+    for output, processes in [('scores.csv', 2), ('scores.parquet', 1)]:
+        rows, seconds = score(dump, str(tmp_path / output), chunk_size = 50,
+                              processes = processes, model_files = model_files_in(str(tmp_path)))
+        assert rows == 130
+        if output.endswith('.csv'):
+            results = pd.read_csv(str(tmp_path / output))
+        else:
+            results = pd.read_parquet(str(tmp_path / output))
+        assert list(results.columns) == RESULT_COLUMNS
+        assert list(results['id']) == list(companies['id'])
+        for column in ['prediction_proba', 'time_predict', 'lab_predict']:
+            np.testing.assert_allclose(results[column], expected[column])
+
+
+def test_read_ids(tmp_path):
+    path = str(tmp_path / 'ids.csv')
+    with open(path, 'w') as f:
+        f.write('id\n12\n 34\n')
+    assert read_ids(path) == ['12', '34']
+
+
+def test_result_writer_parquet_schema(tmp_path):
+    path = str(tmp_path / 'scores.parquet')
+    writer = ResultWriter(path)
+    writer.write(pd.DataFrame({'id': [1], 'name': ['alpha'], 'prediction': np.array([1], dtype = np.uint8),
+                               'prediction_proba': [0.9], 'time_predict': [0.5], 'lab_predict': [0.1]}))
+    # a chunk without any name: a null column for pyarrow
+    writer.write(pd.DataFrame({'id': [2], 'name': [None], 'prediction': np.array([0], dtype = np.uint8),
+                               'prediction_proba': [0.2], 'time_predict': [0.5], 'lab_predict': [0.1]}))
+    writer.close()
+
+    results = pd.read_parquet(path)
+    assert list(results.columns) == RESULT_COLUMNS
+    assert results['name'].tolist() == ['alpha', None]
+    assert results['prediction'].tolist() == [1, 0]
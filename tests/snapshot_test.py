@@ -0,0 +1,57 @@
+# -*- coding: UTF-8 -*-
+
+# Import from standard library
+import numpy as np
+import pandas as pd
+import pytest
+# Import from our lib
+from bpideep.encoders import LabFeatEncoder
+from bpideep.feateng import feat_eng, RAW_FIELDS
+from bpideep.getdata import compact_dtypes
+from bpideep.snapshot import write_snapshot, read_snapshot, snapshot_data
+from bpideep.training import data_hash
+from tests.fixtures import make_companies
+
+pytest.importorskip('pyarrow')
+
+
+def training_data(n):
+    data = compact_dtypes(make_companies(n))
+    data['deep_or_not'] = 'deeptech'
+    data['target'] = np.arange(n) % 2
+    return compact_dtypes(data)
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / 'data.parquet')
+    data = training_data(200)
+    # arrow cannot type these as one column: stored as JSON strings
+    data['revenues'] = [1 if i % 2 else 'unknown' for i in range(200)]
+    data['kpi_summary'] = [{} if i % 3 else None for i in range(200)]
+
+    assert write_snapshot(data, path) == ['revenues', 'kpi_summary']
+    result = read_snapshot(path)
+
+    assert result.dtypes.to_dict() == data.dtypes.to_dict()
+    for column in data.columns:
+        # nested fields as python lists and dicts, their keys possibly reordered
+        assert result[column].equals(data[column]), column
+    assert isinstance(result['tags'][0], list)
+    assert isinstance(result['team'][0], dict)
+    pd.testing.assert_frame_equal(feat_eng(result.copy()), feat_eng(data.copy()))
+
+
+def test_snapshot_data_reads_the_raw_fields(tmp_path):
+    path = str(tmp_path / 'data.parquet')
+    data = training_data(200)
+    write_snapshot(data, path)
+
+    X, y = snapshot_data(path, RAW_FIELDS + ['not_stored'])
+    assert X.columns.tolist() == RAW_FIELDS
+    assert y.tolist() == data['target'].tolist()
+
+    # the features of the three models only need the RAW_FIELDS
+    pd.testing.assert_frame_equal(feat_eng(X.copy()), feat_eng(data.copy()))
+    lab = LabFeatEncoder().fit(data)
+    pd.testing.assert_frame_equal(lab.transform(X.copy()), lab.transform(data.copy()))
+    assert data_hash(X, y) == data_hash(data.drop(columns = 'target'), data['target'])
@@ -0,0 +1,76 @@
+# -*- coding: UTF-8 -*-
+
+# Import from standard library
+import json
+import os
+# Import from third party
+import joblib
+import numpy as np
+import pandas as pd
+# Import from our lib
+from bpideep import trainer, labtrainer
+from bpideep.feateng import all_tags
+from bpideep.registry import MODEL_FILES
+from bpideep.training import train_all, MANIFEST_FILE
+from tests.fixtures import make_companies
+
+
+def test_train_all_matches_separate_trainers(tmp_path):
+    X = make_companies(300)
+    y = pd.Series(np.arange(300) % 2)
+    models = train_all(X, y, output_dir = str(tmp_path), n_jobs = 2)
+
+    manifest = json.load(open(os.path.join(str(tmp_path), MANIFEST_FILE)))
+    assert manifest['nb_companies'] == 300
+    assert set(manifest['timings']) >= {'features', 'fit', 'fit_main', 'fit_lab', 'fit_time'}
+    for name, file in MODEL_FILES.items():
+        assert manifest['models'][name] == file
+        assert os.path.exists(os.path.join(str(tmp_path), file))
+
+    new = make_companies(40, seed = 1)
+    # liblinear shuffles the samples: two fits differ by ~1e-4
+    for name, module in [('main', trainer), ('lab', labtrainer)]:
+        t = module.Trainer(X.copy(), y)
+        t.train()
+        saved = joblib.load(os.path.join(str(tmp_path), MODEL_FILES[name]))
+        np.testing.assert_allclose(saved.predict_proba(new.copy()),
+                                   t.pipeline.predict_proba(new.copy()), atol = 1e-3)
+        np.testing.assert_allclose(models[name].predict_proba(new.copy()),
+                                   t.pipeline.predict_proba(new.copy()), atol = 1e-3)
+
+    # same data, same hash
+    train_all(X, y, output_dir = str(tmp_path / 'again'), n_jobs = 1)
+    again = json.load(open(os.path.join(str(tmp_path / 'again'), MANIFEST_FILE)))
+    assert again['data_hash'] == manifest['data_hash']
+
+
+def test_train_all_sparse(tmp_path):
+    X = make_companies(300)
+    y = pd.Series(np.arange(300) % 2)
+    models = train_all(X, y, output_dir = str(tmp_path), n_jobs = 1, sparse = True)
+    assert json.load(open(os.path.join(str(tmp_path), MANIFEST_FILE)))['sparse']
+
+    t = trainer.Trainer(X.copy(), y)
+    t.set_pipeline(sparse = True)
+    t.pipeline.fit(t.X, y)
+    new = make_companies(40, seed = 1)
+    np.testing.assert_allclose(models['main'].predict_proba(new.copy()),
+                               t.pipeline.predict_proba(new.copy()), atol = 1e-3)
+
+
+def test_train_all_sparse_all_tags(tmp_path):
+    X = make_companies(300)
+    y = pd.Series(np.arange(300) % 2)
+    tags = all_tags(X.copy())
+    models = train_all(X, y, output_dir = str(tmp_path), n_jobs = 1, sparse = True,
+                       kept_tags = tags)
+    assert json.load(open(os.path.join(str(tmp_path), MANIFEST_FILE)))['nb_tags'] == len(tags)
+
+    t = trainer.Trainer(X.copy(), y)
+    t.set_pipeline(sparse = True, kept_tags = tags)
+    t.pipeline.fit(t.X, y)
+    assert t.pipeline.named_steps['featureencoder'].features_list \
+        == models['main'].named_steps['featureencoder'].features_list
+    new = make_companies(40, seed = 1)
+    np.testing.assert_allclose(models['main'].predict_proba(new.copy()),
+                               t.pipeline.predict_proba(new.copy()), atol = 1e-3)
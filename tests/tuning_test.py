@@ -0,0 +1,33 @@
+# -*- coding: UTF-8 -*-
+
+# Import from standard library
+import os
+# Import from third party
+import numpy as np
+import pandas as pd
+# Import from our lib
+from bpideep.tuning import evaluate, search
+from tests.fixtures import make_companies
+
+
+def test_search_caches_the_encoded_folds(tmp_path):
+    X = make_companies(150)
+    y = pd.Series(np.arange(150) % 2)
+    cache_dir = str(tmp_path / 'cache')
+
+    result = search('main', X, y, param_grid = {'model__C': [0.5, 1.52]}, cv = 3,
+                    n_jobs = 2, memory = cache_dir)
+    assert result.best_params_['model__C'] in [0.5, 1.52]
+    assert len(result.cv_results_['params']) == 2
+    # the fitted transformers of the folds are stored by joblib
+    assert os.listdir(cache_dir)
+
+    randomized = search('time', X, y, n_iter = 3, cv = 3, n_jobs = 1)
+    assert len(randomized.cv_results_['params']) == 3
+
+
+def test_evaluate_reports_out_of_fold_predictions():
+    X = make_companies(120)
+    y = pd.Series(np.arange(120) % 2)
+    report = evaluate('lab', X, y, cv = 3, n_jobs = 1)
+    assert 'precision' in report